@@ -1,19 +1,27 @@
 import os
-from fastapi import FastAPI, HTTPException, Depends, Header
+import heapq
+import itertools
+from fastapi import FastAPI, HTTPException, Depends, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from cachetools import TTLCache
-from models import IngestRequest, QueryRequest, RegisterRequest, LoginRequest, TokenResponse
+from models import IngestRequest, QueryRequest, BatchQueryRequest, RegisterRequest, LoginRequest, TokenResponse
 from ingest import ingest_repo
-from query_engine import answer_question
+from query_engine import answer_question, answer_question_across, answer_questions, source
 from auth import hash_password, verify_password, create_access_token, decode_access_token
-from neo4j_client import create_user, get_user_by_email, list_users, get_user_repos, get_user_by_email_or_id, get_repo_metadata
-from github_fetcher import fetch_repo_metadata, get_repo_stats
+from graph_store import get_store
+from shared_index import get_index
+from garbage_collector import GarbageCollector
+from github_fetcher import fetch_repo_metadata, get_repo_stats, iter_files
+from metrics import profile, render as render_metrics, CACHE_REQUESTS
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, paginate, ndjson
 
 app = FastAPI()
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 origins = [
     "http://localhost:3000",
@@ -28,11 +36,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+collector = GarbageCollector()
+
+@app.on_event("startup")
+def setup_store():
+    get_store().setup()
+    collector.start()
+
+@app.on_event("shutdown")
+def close_store():
+    collector.stop()
+    get_store().close()
+
 # In-memory cache: 5 min TTL, max 100 items
 repo_cache = TTLCache(maxsize=100, ttl=300)
 
 class IngestResponse(BaseModel):
     repo_id: str = Field(..., description="The inserted repo ID")
+    files: int = 0
+    chunks: int = 0
+    new_bodies: int = Field(0, description="Chunk bodies embedded and stored by this ingest")
+    dedupe_ratio: float = Field(0.0, description="Share of chunks whose content was already stored")
+    replaced: List[str] = Field(default_factory=list, description="Earlier ingests of the same repo and branch, now deleted: "
+                                "their ids return 404 from here on, use repo_id instead")
 
 class RepoInfo(BaseModel):
     id: str
@@ -41,6 +67,15 @@ class RepoInfo(BaseModel):
     branch: str
     created_at: Optional[str] = None
 
+def read_cursor(cursor: Optional[str]):
+    try:
+        return decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def stream_ndjson(rows):
+    return StreamingResponse(ndjson(rows), media_type="application/x-ndjson")
+
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
     token = credentials.credentials
     try:
@@ -52,69 +87,184 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
 
+def get_optional_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)) -> Optional[str]:
+    """The caller's user_id when a bearer token is sent, else None."""
+    if credentials is None:
+        return None
+    return get_current_user(credentials)
+
 @app.post("/ingest", response_model=IngestResponse)
 def api_ingest(req: IngestRequest):
+    """
+    Every ingest gets a new repo_id. Re-ingesting the same user, owner,
+    repo and branch swaps the new copy in and retires the old ids (listed
+    in "replaced"), which then 404 everywhere; clients holding one should
+    switch to the returned repo_id, or look it up again in /my-repos.
+    """
     try:
-        repo_id = ingest_repo(req.owner, req.repo, req.branch, req.user_id)
-        return IngestResponse(repo_id=str(repo_id))
+        summary = ingest_repo(req.owner, req.repo, req.branch, req.user_id)
+        for old_id in summary["replaced"]:
+            repo_cache.pop(old_id, None)
+        if summary["replaced"]:
+            collector.wake()
+        return IngestResponse(**{**summary, "repo_id": str(summary["repo_id"])})
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+def query_scope(req: QueryRequest, current_user_id: Optional[str]) -> Optional[list]:
+    """None for a single-repo query, else the repo ids to search across."""
+    scopes = [s for s in (req.repo_id, req.repo_ids, req.my_repos or None) if s is not None]
+    if len(scopes) != 1:
+        raise HTTPException(status_code=400, detail="Set exactly one of repo_id, repo_ids or my_repos")
+    if req.repo_id is not None:
+        return None
+    if req.repo_ids is not None:
+        return list(dict.fromkeys(str(r) for r in req.repo_ids))
+    # The owner always comes from the token, never from the request body
+    if current_user_id is None:
+        raise HTTPException(status_code=401, detail="my_repos needs a bearer token")
+    return [r["id"] for r in get_store().iter_user_repos(current_user_id)]
+
+def require_ready(repo_ids: list):
+    """404 unless every repo exists, is not deleted or replaced, and has finished ingesting."""
+    statuses = get_store().get_repo_statuses(repo_ids)
+    missing = [repo_id for repo_id in repo_ids if statuses.get(repo_id) != "ready"]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Repo not found: {', '.join(missing)}")
+
 @app.post("/query")
-def api_query(req: QueryRequest):
+def api_query(req: QueryRequest, x_profile: Optional[str] = Header(None),
+              current_user_id: Optional[str] = Depends(get_optional_user)):
+    repo_ids = query_scope(req, current_user_id)
+    if repo_ids == []:
+        raise HTTPException(status_code=404, detail="No repos to search")
+    # Checked before anything is embedded or sent to the LLM
+    if repo_ids is None:
+        require_ready([str(req.repo_id)])
+    elif req.repo_ids is not None:
+        require_ready(repo_ids)
     try:
-        answer = answer_question(str(req.repo_id), req.question, req.top_k)
-        return {"answer": answer}
+        # X-Profile: 1 returns a per-stage timing breakdown for this request
+        with profile(enabled=bool(x_profile) and x_profile != "0") as report:
+            if repo_ids is None:
+                result = {"answer": answer_question(str(req.repo_id), req.question, req.top_k, req.mode, req.top_files)}
+            else:
+                answer, chunks = answer_question_across(repo_ids, req.question, req.top_k, req.mode, req.top_files)
+                sources = [source(c) for c in chunks]
+                result = {"answer": answer, "sources": sources}
+        if report is not None:
+            result["profile"] = report
+        return result
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/query/batch")
+def api_query_batch(req: BatchQueryRequest):
+    """
+    Answers every question about one repo. Streams NDJSON, one line per
+    question as its answer completes, with "index" into req.questions.
+    """
+    require_ready([str(req.repo_id)])
+    try:
+        answers = answer_questions(str(req.repo_id), req.questions, req.top_k, req.mode, req.top_files,
+                                   req.max_parallel)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return stream_ndjson(answers)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.post("/register", response_model=TokenResponse)
 def register(req: RegisterRequest):
-    existing = get_user_by_email(req.email)
+    existing = get_store().get_user_by_email(req.email)
     if existing:
         raise HTTPException(400, "Email already registered")
     hashed_pw = hash_password(req.password)
-    user_id = create_user(req.email, hashed_pw)
+    user_id = get_store().create_user(req.email, hashed_pw)
     token = create_access_token({"sub": user_id})
     return TokenResponse(access_token=token)
 
 @app.post("/login", response_model=TokenResponse)
 def login(req: LoginRequest):
-    user = get_user_by_email(req.email)
+    user = get_store().get_user_by_email(req.email)
     if not user or not verify_password(req.password, user["password"]):
         raise HTTPException(401, "Invalid email or password")
     token = create_access_token({"sub": user["user_id"]})
     return TokenResponse(access_token=token)
 
 @app.get("/users")
-def get_users():
-    users = list_users()
-    return {"users": users}
+def get_users(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: bool = False
+):
+    after = read_cursor(cursor)
+    if stream:
+        return stream_ndjson(get_store().iter_users(after))
+    users, next_cursor = paginate(get_store().list_users(limit + 1, after), limit, "user_id")
+    return {"users": users, "next_cursor": next_cursor}
 
 @app.get("/debug/list-files")
-def debug_list_files(owner: str, repo: str, branch: str = "main"):
-    from github_fetcher import list_files
+def debug_list_files(
+    owner: str,
+    repo: str,
+    branch: str = "main",
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: bool = False
+):
+    after = read_cursor(cursor)
     try:
-        files = list_files(owner, repo, branch)
-        return {"total_files": len(files), "files": files}
+        paths = iter_files(owner, repo, branch)
+        total = 0
+        if not stream:
+            def counted(rows):
+                nonlocal total
+                for row in rows:
+                    total += 1
+                    yield row
+            # The page scan reads the whole tree anyway, so the total is free
+            paths = counted(paths)
+        if after is not None:
+            paths = (p for p in paths if p > after)
+        if stream:
+            # Pull the first row eagerly so GitHub errors still become a 400
+            first = next(paths, None)
+            head = [first] if first is not None else []
+            rows = ({"path": p} for p in itertools.chain(head, paths))
+            return stream_ndjson(rows)
+        # Only keep limit + 1 paths in memory, however large the tree is
+        files, next_cursor = paginate(heapq.nsmallest(limit + 1, paths), limit)
+        return {"total_files": total, "files": files, "next_cursor": next_cursor}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/my-repos")
-def get_my_repos(current_user_id: str = Depends(get_current_user)):
+def get_my_repos(
+    current_user_id: str = Depends(get_current_user),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: bool = False
+):
+    before = read_cursor(cursor)
+    if stream:
+        return stream_ndjson(get_store().iter_user_repos(current_user_id, before))
     try:
-        repos = get_user_repos(current_user_id)
+        repos, next_cursor = paginate(get_store().get_user_repos(current_user_id, limit + 1, before), limit, "id")
         return {
             "user_id": current_user_id,
-            "total_repos": len(repos),
-            "repos": repos
+            "total_repos": get_store().count_user_repos(current_user_id),
+            "repos": repos,
+            "next_cursor": next_cursor
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/me")
 def get_current_user_info(current_user_id: str = Depends(get_current_user)):
-    user = get_user_by_email_or_id(current_user_id)
+    user = get_store().get_user_by_email_or_id(current_user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return {
@@ -122,6 +272,24 @@ def get_current_user_info(current_user_id: str = Depends(get_current_user)):
         "email": user["email"]
     }
 
+@app.delete("/repos/{repo_id}")
+def api_delete_repo(repo_id: str, current_user_id: str = Depends(get_current_user)):
+    store = get_store()
+    try:
+        repo = store.get_repo_metadata(repo_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Repo not found")
+    # Repos ingested without a user_id belong to nobody, so no token may delete them
+    if repo.get("user_id") != current_user_id:
+        raise HTTPException(status_code=403, detail="Not your repo")
+    if not store.delete_repo(repo_id):
+        raise HTTPException(status_code=404, detail="Repo not found")
+    repo_cache.pop(repo_id, None)
+    if get_index() is not None:
+        get_index().drop(repo_id)
+    collector.wake()
+    return {"deleted": repo_id}
+
 @app.get("/repo-metadata/{repo_id}")
 def api_repo_metadata(
     repo_id: str,
@@ -130,13 +298,16 @@ def api_repo_metadata(
     # Check cache
     if repo_id in repo_cache:
         print(f"Cache HIT for {repo_id}")
+        CACHE_REQUESTS.inc(1, "repo_metadata", "hit")
         return repo_cache[repo_id]
     
     print(f"Cache MISS for {repo_id}")
+    CACHE_REQUESTS.inc(1, "repo_metadata", "miss")
     
-    # Fetch from database
-    repoNode = get_repo_metadata(repo_id)
-    if not repoNode:
+    # Fetch from database; deleted and replaced repos are gone
+    try:
+        repoNode = get_store().get_repo_metadata(repo_id)
+    except ValueError:
         raise HTTPException(404, "Repo not found")
 
     owner = repoNode["owner"]
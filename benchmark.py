@@ -0,0 +1,343 @@
+# benchmark.py
+"""
+Offline end-to-end benchmark: ingest a synthetic repo served by a fake
+GitHub, compare flat and hierarchical retrieval in-process, then
+load-test /query against a fake OpenAI.
+
+    python benchmark.py --files 500 --concurrency 1,8,32 --output bench.json
+
+`python benchmark.py startup` instead measures cold `import app` time and
+RSS, and per-worker memory when --workers processes scan the same repo
+from a private copy versus the shared memory-mapped index.
+
+Results are written as JSON so runs can be diffed.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+
+from fake_servers import FakeEncoding, FakeGitHub, FakeOpenAI
+
+
+def percentiles(samples: list) -> dict:
+    arr = np.asarray(samples) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p95_ms": round(float(np.percentile(arr, 95)), 3),
+        "p99_ms": round(float(np.percentile(arr, 99)), 3),
+        "mean_ms": round(float(arr.mean()), 3),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_api(port: int):
+    import uvicorn
+    from app import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def bench_ingest(args) -> dict:
+    from ingest import ingest_repo
+    from graph_store import get_store
+
+    start = time.perf_counter()
+    summary = ingest_repo("bench", "synthetic", "main")
+    elapsed = time.perf_counter() - start
+
+    # A second branch with identical content: every chunk body is reused
+    start = time.perf_counter()
+    branch = ingest_repo("bench", "synthetic", "dev")
+    branch_elapsed = time.perf_counter() - start
+
+    chunks = len(get_store().scan_vectors(summary["repo_id"])[0])
+    return {
+        "repo_id": summary["repo_id"],
+        "files": args.files,
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "files_per_sec": round(args.files / elapsed, 2),
+        "chunks_per_sec": round(chunks / elapsed, 2),
+        "dedupe_ratio": summary["dedupe_ratio"],
+        "second_branch": {
+            "seconds": round(branch_elapsed, 3),
+            "new_bodies": branch["new_bodies"],
+            "dedupe_ratio": branch["dedupe_ratio"],
+        },
+    }
+
+
+def bench_query(args, repo_id: str, base_url: str) -> list:
+    questions = [f"How does func_{i} work and what calls it?" for i in range(args.queries)]
+    results = []
+
+    for concurrency in args.concurrency:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=concurrency)
+        session.mount("http://", adapter)
+
+        def one(question):
+            t0 = time.perf_counter()
+            r = session.post(f"{base_url}/query", json={"repo_id": repo_id, "question": question, "top_k": args.top_k})
+            r.raise_for_status()
+            return time.perf_counter() - t0
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(one, questions))
+        wall = time.perf_counter() - start
+
+        results.append({
+            "concurrency": concurrency,
+            "queries": len(latencies),
+            "throughput_qps": round(len(latencies) / wall, 2),
+            **percentiles(latencies),
+        })
+        print(f"  concurrency={concurrency}: {results[-1]}")
+    return results
+
+
+def bench_retrieval(args, repo_id: str) -> list:
+    """
+    Recall@k of hierarchical retrieval against the exact flat scan, plus
+    per-query latency of each mode and of the same queries scored as one
+    batch. Queries are stored chunk vectors with noise added, so each one
+    has a known neighbourhood in the repo.
+    """
+    from graph_store import get_store
+    from query_engine import rank_chunks, select_chunks_batch, fetch_scored_batch
+
+    _, _, matrix = get_store().scan_vectors(repo_id)
+    rng = np.random.default_rng(0)
+    picks = rng.choice(len(matrix), size=min(args.retrieval_queries, len(matrix)), replace=False)
+    noise = rng.standard_normal((len(picks), matrix.shape[1])).astype(np.float32) / np.sqrt(matrix.shape[1])
+    queries = matrix[picks] + noise
+
+    def run(mode, top_files=None):
+        # lambda_mult=1 with no graph prior or neighbours ranks purely by
+        # relevance, so flat is the exact top-k
+        latencies, results = [], []
+        for q in queries:
+            t0 = time.perf_counter()
+            chunks = rank_chunks(repo_id, q, args.top_k, lambda_mult=1.0, mode=mode, top_files=top_files,
+                                 centrality_weight=0, neighbor_chunks=0)
+            latencies.append(time.perf_counter() - t0)
+            results.append({c["id"] for c in chunks})
+        return latencies, results
+
+    flat_latencies, exact = run("flat")
+    results = [{"mode": "flat", "recall_at_k": 1.0, **percentiles(flat_latencies)}]
+    for top_files in args.top_files:
+        latencies, found = run("hierarchical", top_files)
+        recall = np.mean([len(f & e) / len(e) for f, e in zip(found, exact) if e])
+        results.append({"mode": "hierarchical", "top_files": top_files,
+                        "recall_at_k": round(float(recall), 4), **percentiles(latencies)})
+
+    t0 = time.perf_counter()
+    batch = fetch_scored_batch(select_chunks_batch(repo_id, queries, args.top_k, lambda_mult=1.0,
+                                                   centrality_weight=0, neighbor_chunks=0))
+    per_query = (time.perf_counter() - t0) / len(queries)
+    recall = np.mean([len({c["id"] for c in b} & e) / len(e) for b, e in zip(batch, exact) if e])
+    results.append({"mode": "flat_batch", "queries": len(queries), "recall_at_k": round(float(recall), 4),
+                    "mean_ms": round(per_query * 1000, 3)})
+
+    # MMR alone over a few hundred full-width candidates at the top_k maximum
+    from rerank import mmr
+    candidates = rng.standard_normal((300, 3072)).astype(np.float32)
+    relevance = rng.random(300)
+    groups = [str(i % 40) for i in range(300)]
+    latencies = []
+    for _ in range(200):
+        t0 = time.perf_counter()
+        mmr(candidates, relevance, 25, groups=groups, max_per_group=2)
+        latencies.append(time.perf_counter() - t0)
+    results.append({"mode": "mmr", "candidates": 300, "dim": 3072, "k": 25, **percentiles(latencies)})
+    for r in results:
+        print(f"  {r}")
+    return results
+
+
+def memory_usage() -> dict:
+    """VmRSS, and PSS (shared pages split between the processes mapping them) where Linux reports it."""
+    usage = {}
+    for name, key in (("/proc/self/status", "VmRSS:"), ("/proc/self/smaps_rollup", "Pss:")):
+        try:
+            with open(name) as f:
+                for line in f:
+                    if line.startswith(key):
+                        usage[key[:-1].lower() + "_kb"] = int(line.split()[1])
+                        break
+        except OSError:
+            pass
+    return usage
+
+
+IMPORT_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import app
+seconds = time.perf_counter() - start
+from benchmark import memory_usage
+print(json.dumps({"seconds": seconds, **memory_usage()}))
+"""
+
+
+def _index_worker(directory, repo_id, mode, barrier, results):
+    from shared_index import SharedIndex
+    if mode == "mmap":
+        matrix = SharedIndex(directory).attach(repo_id).matrix
+    else:
+        matrix = np.load(os.path.join(directory, repo_id + ".npy"))
+    matrix @ np.ones(matrix.shape[1], dtype=np.float32)     # touch every page, like a flat scan
+    barrier.wait()
+    results.put(memory_usage())
+    barrier.wait()
+
+
+def bench_startup(args) -> dict:
+    root = os.path.dirname(os.path.abspath(__file__))
+    imports = []
+    for _ in range(args.import_runs):
+        out = subprocess.check_output([sys.executable, "-c", IMPORT_SCRIPT], cwd=root, text=True)
+        imports.append(json.loads(out.strip().splitlines()[-1]))
+    print(f"  import app: {imports}")
+
+    from shared_index import SharedIndex
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((args.index_chunks, args.dim), dtype=np.float32)
+    workers = {}
+    with tempfile.TemporaryDirectory() as directory:
+        SharedIndex(directory).publish("bench", [str(i) for i in range(len(matrix))], ["f.py"] * len(matrix), matrix)
+        ctx = multiprocessing.get_context("spawn")
+        for mode in ("private", "mmap"):
+            barrier, results = ctx.Barrier(args.workers), ctx.Queue()
+            procs = [ctx.Process(target=_index_worker, args=(directory, "bench", mode, barrier, results))
+                     for _ in range(args.workers)]
+            for p in procs:
+                p.start()
+            usage = [results.get() for _ in procs]
+            for p in procs:
+                p.join()
+            workers[mode] = {k: round(float(np.mean([u[k] for u in usage]))) for k in usage[0]}
+            print(f"  {args.workers} workers, {mode}: {workers[mode]}")
+
+    return {
+        "import": {
+            "seconds_mean": round(float(np.mean([r["seconds"] for r in imports])), 3),
+            "rss_kb_mean": round(float(np.mean([r.get("vmrss_kb", 0) for r in imports]))),
+        },
+        "index_mb": round(matrix.nbytes / 2**20, 1),
+        "workers": args.workers,
+        "per_worker": workers,
+    }
+
+
+def write_report(args, **sections):
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        **sections,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Wrote {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", nargs="?", choices=["run", "startup"], default="run")
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--lines-per-file", type=int, default=120)
+    parser.add_argument("--dim", type=int, default=3072, help="embedding dimension served by the fake OpenAI")
+    parser.add_argument("--embed-latency-ms", type=float, default=0)
+    parser.add_argument("--chat-latency-ms", type=float, default=0)
+    parser.add_argument("--queries", type=int, default=100, help="queries per concurrency level")
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 4, 16])
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--retrieval-queries", type=int, default=200, help="in-process queries for the flat vs hierarchical comparison")
+    parser.add_argument("--top-files", type=lambda s: [int(c) for c in s.split(",")], default=[5, 20, 50],
+                        help="hierarchical tier sizes to compare")
+    parser.add_argument("--backend", default="memory", help="GRAPH_BACKEND to benchmark against")
+    parser.add_argument("--tokenizer", choices=["fake", "tiktoken"], default="fake",
+                        help="fake keeps the run offline; tiktoken downloads cl100k_base unless it is cached")
+    parser.add_argument("--import-runs", type=int, default=3, help="startup: cold `import app` runs")
+    parser.add_argument("--index-chunks", type=int, default=20000, help="startup: rows in the shared index")
+    parser.add_argument("--workers", type=int, default=4, help="startup: worker processes attaching the index")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    if args.command == "startup":
+        print("Measuring startup and per-worker memory...")
+        write_report(args, startup=bench_startup(args))
+        return
+
+    github = FakeGitHub(num_files=args.files, lines_per_file=args.lines_per_file).start()
+    openai_server = FakeOpenAI(args.dim, args.embed_latency_ms, args.chat_latency_ms).start()
+
+    # Must be set before the app modules are imported: they read config at import time
+    os.environ.update({
+        "GITHUB_API_URL": github.url,
+        "GITHUB_RAW_URL": github.url,
+        "OPENAI_BASE_URL": f"{openai_server.url}/v1",
+        "OPENAI_API_KEY": "bench",
+        "GRAPH_BACKEND": args.backend,
+    })
+
+    if args.tokenizer == "fake":
+        from chunker import set_encoding
+        set_encoding(FakeEncoding())
+
+    from graph_store import get_store
+    get_store().setup()
+
+    print(f"Ingesting {args.files} synthetic files...")
+    ingest = bench_ingest(args)
+    print(f"  {ingest}")
+
+    print("Comparing flat and hierarchical retrieval...")
+    retrieval = bench_retrieval(args, ingest["repo_id"])
+
+    print("Querying...")
+    port = free_port()
+    api = start_api(port)
+    query = bench_query(args, ingest["repo_id"], f"http://127.0.0.1:{port}")
+    api.should_exit = True
+
+    write_report(args, ingest=ingest, retrieval=retrieval, query=query)
+
+    github.stop()
+    openai_server.stop()
+
+
+if __name__ == "__main__":
+    main()
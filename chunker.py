@@ -1,15 +1,32 @@
 # chunker.py
-import tiktoken
+import threading
 
-ENC = tiktoken.get_encoding("cl100k_base")
+_encoding = None
+_encoding_lock = threading.Lock()
+
+def get_encoding():
+    """The cl100k_base encoding, loaded on first use (tiktoken may download the BPE file)."""
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                import tiktoken
+                _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+def set_encoding(encoding):
+    """Swap the tokenizer (benchmarks and tests); anything with encode/decode."""
+    global _encoding
+    _encoding = encoding
 
 def chunk_text_by_tokens(text: str, max_tokens: int = 400, overlap: int = 50):
-    tokens = ENC.encode(text)
+    enc = get_encoding()
+    tokens = enc.encode(text)
     chunks = []
     start = 0
     while start < len(tokens):
         end = min(start + max_tokens, len(tokens))
-        chunk = ENC.decode(tokens[start:end])
+        chunk = enc.decode(tokens[start:end])
         chunks.append(chunk)
         if end == len(tokens):
             break
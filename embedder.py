@@ -1,13 +1,26 @@
 # embedder.py
 import os
-from openai import OpenAI
+import threading
 from dotenv import load_dotenv
+from metrics import stage, TOKENS_TOTAL
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 EMBED_MODEL = "text-embedding-3-large"
 
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """The OpenAI client, created on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
+
 def embed_texts(texts: list):
     """
     texts: List[str]
@@ -17,9 +30,11 @@ def embed_texts(texts: list):
     batch_size = 32
     for i in range(0, len(texts), batch_size):
         sub = texts[i:i+batch_size]
-        resp = client.embeddings.create(
-            model=EMBED_MODEL,
-            input=sub
-        )
+        with stage("embed"):
+            resp = get_client().embeddings.create(
+                model=EMBED_MODEL,
+                input=sub
+            )
+        TOKENS_TOTAL.inc(resp.usage.total_tokens, "embedding")
         embeddings.extend([item.embedding for item in resp.data])
     return embeddings
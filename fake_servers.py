@@ -0,0 +1,230 @@
+# fake_servers.py
+"""
+Local stand-ins for GitHub, OpenAI and the tiktoken encoding so ingest
+and query can be benchmarked offline.
+
+    github = FakeGitHub(num_files=500).start()
+    openai = FakeOpenAI(chat_latency_ms=20).start()
+    os.environ["GITHUB_API_URL"] = github.url
+    os.environ["GITHUB_RAW_URL"] = github.url
+    os.environ["OPENAI_BASE_URL"] = openai.url + "/v1"
+    chunker.set_encoding(FakeEncoding())
+"""
+import hashlib
+import io
+import json
+import random
+import re
+import tarfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import numpy as np
+
+
+class FakeEncoding:
+    """
+    Deterministic tokenizer with tiktoken's encode/decode: one token per
+    word, punctuation mark or whitespace run, so decode(encode(t)) == t
+    and code gets roughly as many tokens as with cl100k_base.
+    """
+    PIECES = re.compile(r"\w+|[^\w\s]|\s+")
+
+    def __init__(self):
+        self._ids = {}
+        self._vocab = []
+        self._lock = threading.Lock()
+
+    def encode(self, text: str) -> list:
+        with self._lock:
+            tokens = []
+            for piece in self.PIECES.findall(text):
+                token = self._ids.get(piece)
+                if token is None:
+                    token = self._ids[piece] = len(self._vocab)
+                    self._vocab.append(piece)
+                tokens.append(token)
+            return tokens
+
+    def decode(self, tokens: list) -> str:
+        return "".join(self._vocab[t] for t in tokens)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body: bytes, content_type: str = "application/json", status: int = 200, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, obj, status: int = 200, headers: dict = None):
+        self.send_body(json.dumps(obj).encode(), status=status, headers=headers)
+
+    def read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+
+class _FakeServer:
+    handler = _Handler
+
+    def start(self):
+        server = self
+        handler = type("Handler", (self.handler,), {"fake": server})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+# GitHub
+
+class _GitHubHandler(_Handler):
+    def do_GET(self):
+        fake = self.fake
+        parts = urlparse(self.path).path.strip("/").split("/")
+        headers = {"X-RateLimit-Remaining": str(fake.rate_limit_remaining())}
+
+        # /repos/{owner}/{repo}/git/trees/{branch}
+        if parts[:1] == ["repos"] and parts[3:5] == ["git", "trees"]:
+            tree = [{"path": p, "type": "blob", "size": len(c)} for p, c in fake.files.items()]
+            return self.send_json({"sha": "0" * 40, "tree": tree, "truncated": False}, headers=headers)
+
+        # /repos/{owner}/{repo}/tarball/{branch}
+        if parts[:1] == ["repos"] and parts[3:4] == ["tarball"]:
+            return self.send_body(fake.tarball(parts[2]), "application/gzip", headers=headers)
+
+        # /repos/{owner}/{repo}
+        if parts[:1] == ["repos"] and len(parts) == 3:
+            return self.send_json({"full_name": f"{parts[1]}/{parts[2]}", "default_branch": "main"}, headers=headers)
+
+        # Raw content: /{owner}/{repo}/{branch}/{path}
+        path = "/".join(parts[3:])
+        if path in fake.files:
+            return self.send_body(fake.files[path].encode(), "text/plain; charset=utf-8", headers=headers)
+
+        self.send_json({"message": "Not Found"}, status=404, headers=headers)
+
+
+class FakeGitHub(_FakeServer):
+    """Serves one synthetic repo (for any owner/repo/branch) with Python files that import each other."""
+
+    handler = _GitHubHandler
+
+    def __init__(self, num_files: int = 200, lines_per_file: int = 120, imports_per_file: int = 3,
+                 packages: int = 10, seed: int = 0):
+        rng = random.Random(seed)
+        paths = [f"pkg{i % packages}/module_{i}.py" for i in range(num_files)]
+        self.files = {}
+        for i, path in enumerate(paths):
+            deps = rng.sample(range(num_files), min(imports_per_file, num_files))
+            lines = [f"from pkg{d % packages}.module_{d} import func_{d}" for d in deps if d != i]
+            for n in range(lines_per_file):
+                lines.append(f"def func_{i}_{n}(x):\n    return x * {rng.randint(1, 1000)}  # {rng.random():.6f}")
+            self.files[path] = "\n".join(lines) + "\n"
+        self._tarball = None
+        self._requests = 0
+        self._lock = threading.Lock()
+
+    def rate_limit_remaining(self) -> int:
+        with self._lock:
+            self._requests += 1
+            return max(0, 5000 - self._requests)
+
+    def tarball(self, repo: str) -> bytes:
+        if self._tarball is None:
+            buf = io.BytesIO()
+            with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+                for path, content in self.files.items():
+                    data = content.encode()
+                    info = tarfile.TarInfo(f"{repo}-main/{path}")
+                    info.size = len(data)
+                    tar.addfile(info, io.BytesIO(data))
+            self._tarball = buf.getvalue()
+        return self._tarball
+
+
+# OpenAI
+
+def fake_embedding(text: str, dim: int) -> list:
+    """Deterministic unit vector derived from the text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+    vec = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vec / np.linalg.norm(vec)).tolist()
+
+
+class _OpenAIHandler(_Handler):
+    def do_POST(self):
+        fake = self.fake
+        path = urlparse(self.path).path
+        body = self.read_json()
+
+        if path.endswith("/embeddings"):
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            fake.sleep(fake.embed_latency_ms)
+            tokens = sum(len(t.split()) for t in inputs)
+            return self.send_json({
+                "object": "list",
+                "model": body.get("model"),
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": fake_embedding(t, fake.dim)}
+                    for i, t in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            })
+
+        if path.endswith("/chat/completions"):
+            fake.sleep(fake.chat_latency_ms)
+            prompt = body["messages"][-1]["content"]
+            digest = hashlib.sha256(prompt.encode()).hexdigest()[:16]
+            return self.send_json({
+                "id": f"chatcmpl-{digest}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": f"Synthetic answer {digest}."},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": 3,
+                          "total_tokens": len(prompt.split()) + 3},
+            })
+
+        self.send_json({"error": {"message": "Not Found"}}, status=404)
+
+
+class FakeOpenAI(_FakeServer):
+    """OpenAI-compatible embeddings and chat completions with configurable latency."""
+
+    handler = _OpenAIHandler
+
+    def __init__(self, dim: int = 3072, embed_latency_ms: float = 0, chat_latency_ms: float = 0):
+        self.dim = dim
+        self.embed_latency_ms = embed_latency_ms
+        self.chat_latency_ms = chat_latency_ms
+
+    @staticmethod
+    def sleep(ms: float):
+        if ms:
+            time.sleep(ms / 1000)
@@ -0,0 +1,102 @@
+# garbage_collector.py
+"""
+Background purge of deleted and replaced repos.
+
+delete_repo and promote_repo only tombstone a repo. This worker then
+removes its chunks, files and edges through purge_repo, one bounded
+batch per call, so no single transaction touches a whole repo.
+
+An ingest that crashed leaves its repo "ingesting" for good; each pass
+first tombstones those older than INGEST_TIMEOUT_SECONDS.
+
+Every worker starts a collector, but only the one holding the "gc" lease
+in the store runs a pass, so a multi-worker deployment purges each
+tombstone once. GC_ENABLED=0 keeps a worker out of it entirely.
+"""
+import os
+import socket
+import threading
+from uuid import uuid4
+from graph_store import get_store
+from metrics import stage, GC_REMOVED_TOTAL
+from shared_index import get_index
+
+GC_BATCH_SIZE = int(os.getenv("GC_BATCH_SIZE", "1000"))
+GC_INTERVAL_SECONDS = float(os.getenv("GC_INTERVAL_SECONDS", "300"))
+# Longer than any real ingest: an older "ingesting" repo is assumed dead
+INGEST_TIMEOUT_SECONDS = float(os.getenv("INGEST_TIMEOUT_SECONDS", "21600"))
+GC_ENABLED = os.getenv("GC_ENABLED", "1").lower() not in ("0", "false", "no")
+# A holder that stops renewing (crashed worker) loses the lease after this
+GC_LEASE_SECONDS = float(os.getenv("GC_LEASE_SECONDS", "120"))
+
+
+def collect(store=None, batch_size: int = GC_BATCH_SIZE, stop: threading.Event = None,
+            ingest_timeout: float = INGEST_TIMEOUT_SECONDS, lease=None) -> int:
+    """
+    Purge every tombstoned repo. Returns how many chunks, files and repos
+    were removed. lease, if given, is called before each repo and the pass
+    ends as soon as it returns False.
+    """
+    store = store or get_store()
+    if lease is not None and not lease():
+        return 0
+    for repo_id in store.expire_ingests(ingest_timeout):
+        print(f"⚠️  Expiring ingest {repo_id}, never finished")
+    removed = 0
+    for repo_id in store.list_deleted_repos():
+        if lease is not None and not lease():
+            break
+        while not (stop and stop.is_set()):
+            with stage("gc"):
+                n = store.purge_repo(repo_id, batch_size)
+            if not n:
+                if get_index() is not None:
+                    get_index().drop(repo_id)
+                break
+            removed += n
+            GC_REMOVED_TOTAL.inc(n)
+    return removed
+
+
+class GarbageCollector:
+    """Runs collect() every interval seconds, or sooner when woken."""
+
+    def __init__(self, interval: float = GC_INTERVAL_SECONDS, batch_size: int = GC_BATCH_SIZE,
+                 ingest_timeout: float = INGEST_TIMEOUT_SECONDS):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.ingest_timeout = ingest_timeout
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None and GC_ENABLED:
+            self._thread = threading.Thread(target=self._run, name="garbage-collector", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _renew(self) -> bool:
+        return get_store().acquire_lease("gc", self.holder, max(GC_LEASE_SECONDS, 2 * self.interval))
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                removed = collect(batch_size=self.batch_size, stop=self._stop, ingest_timeout=self.ingest_timeout,
+                                  lease=self._renew)
+                if removed:
+                    print(f"🧹 Garbage collector removed {removed} chunks, files and repos")
+            except Exception as e:
+                print(f"❌ Garbage collection failed: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
@@ -3,6 +3,7 @@ import requests
 import os
 from dotenv import load_dotenv
 from datetime import datetime, timedelta, timezone
+from metrics import GITHUB_RATE_LIMIT_REMAINING
 
 load_dotenv()
 
@@ -26,24 +27,39 @@ def get_week_ranges():
         "last_week_until": iso(start_of_week)
     }
 
+def track_rate_limit(r):
+    remaining = r.headers.get("X-RateLimit-Remaining")
+    if remaining is not None:
+        GITHUB_RATE_LIMIT_REMAINING.set(int(remaining))
+
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+# Overridable so benchmarks can point at a local fake (see fake_servers.py)
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+GITHUB_RAW_URL = os.getenv("GITHUB_RAW_URL", "https://raw.githubusercontent.com").rstrip("/")
 
-def list_files(owner: str, repo: str, branch: str = "main"):
-    url = f"https://api.github.com/repos/{owner}/{repo}/git/trees/{branch}?recursive=1"
+def iter_files(owner: str, repo: str, branch: str = "main"):
+    """Yield blob paths from the recursive tree without collecting them into a list."""
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/git/trees/{branch}?recursive=1"
     headers = {}
     if GITHUB_TOKEN:
         headers["Authorization"] = f"token {GITHUB_TOKEN}"
     r = requests.get(url, headers=headers)
+    track_rate_limit(r)
     r.raise_for_status()
-    tree = r.json().get("tree", [])
-    return [item["path"] for item in tree if item["type"] == "blob"]
+    for item in r.json().get("tree", []):
+        if item["type"] == "blob":
+            yield item["path"]
+
+def list_files(owner: str, repo: str, branch: str = "main"):
+    return list(iter_files(owner, repo, branch))
 
 def fetch_raw(owner: str, repo: str, path: str, branch: str = "main"):
-    raw = f"https://raw.githubusercontent.com/{owner}/{repo}/{branch}/{path}"
+    raw = f"{GITHUB_RAW_URL}/{owner}/{repo}/{branch}/{path}"
     headers = {}
     if GITHUB_TOKEN:
         headers["Authorization"] = f"token {GITHUB_TOKEN}"
     r = requests.get(raw, headers=headers)
+    track_rate_limit(r)
     r.raise_for_status()
     return r.text
 
@@ -62,29 +78,32 @@ def compute_loc(owner, repo, branch="main"):
 
 
 def fetch_repo_metadata(owner: str, repo_name: str):
-    url = f"https://api.github.com/repos/{owner}/{repo_name}"
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo_name}"
     headers = {}
     if GITHUB_TOKEN:
         headers["Authorization"] = f"token {GITHUB_TOKEN}"
 
     r = requests.get(url, headers=headers)
+    track_rate_limit(r)
     r.raise_for_status()
 
     return r.json()
 
 def fetch_contributors(owner, repo):
-    url = f"https://api.github.com/repos/{owner}/{repo}/contributors?per_page=100"
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/contributors?per_page=100"
     headers = {"Authorization": f"token {GITHUB_TOKEN}"}
     r = requests.get(url, headers=headers)
+    track_rate_limit(r)
     r.raise_for_status()
     return len(r.json())
 
 
 def fetch_weekly_loc_changes(owner, repo):
-    url = f"https://api.github.com/repos/{owner}/{repo}/stats/code_frequency"
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/stats/code_frequency"
     headers = {"Authorization": f"token {GITHUB_TOKEN}"}
 
     r = requests.get(url, headers=headers)
+    track_rate_limit(r)
     r.raise_for_status()
     data = r.json()
 
@@ -116,12 +135,13 @@ def fetch_weekly_loc_changes(owner, repo):
     }
 
 def fetch_commits(owner, repo, since, until):
-    url = f"https://api.github.com/repos/{owner}/{repo}/commits"
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/commits"
     headers = {"Authorization": f"token {GITHUB_TOKEN}"}
 
     params = {"since": since, "until": until, "per_page": 100}
 
     r = requests.get(url, headers=headers, params=params)
+    track_rate_limit(r)
     r.raise_for_status()
 
     return r.json()
@@ -0,0 +1,194 @@
+# graph_store.py
+"""
+Storage interface for everything the API, ingest and query paths need
+from the graph. Pick a backend with GRAPH_BACKEND:
+
+    neo4j   (default) the Neo4j database configured in neo4j_client.py
+    memory  an in-process store (memory_store.py), optionally persisted
+            to SQLite at MEMORY_STORE_PATH
+"""
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class GraphStore(ABC):
+    def setup(self):
+        """Called once at app startup (schema bootstrap, loading from disk, ...)."""
+
+    def close(self):
+        """Called at shutdown."""
+
+    # Users
+    @abstractmethod
+    def create_user(self, email: str, hashed_pw: str) -> str: ...
+
+    @abstractmethod
+    def get_user_by_email(self, email: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    def get_user_by_email_or_id(self, identifier: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    def list_users(self, limit: int = None, after: str = None) -> List[dict]: ...
+
+    @abstractmethod
+    def iter_users(self, after: str = None) -> Iterator[dict]: ...
+
+    # Repos
+    @abstractmethod
+    def insert_repo(self, owner: str, repo: str, branch: str = "main", user_id: str = None) -> str: ...
+
+    @abstractmethod
+    def get_repo_metadata(self, repo_id: str) -> dict:
+        """Raises ValueError if the repo does not exist."""
+
+    @abstractmethod
+    def get_repo_statuses(self, repo_ids: List[str]) -> Dict[str, str]:
+        """Status of each repo in one lookup; unknown ids are left out."""
+
+    @abstractmethod
+    def promote_repo(self, repo_id: str) -> List[str]:
+        """
+        Make a freshly ingested repo the live one for its (user_id, owner,
+        repo, branch), tombstoning and returning the ids it replaces.
+        Raises ValueError unless the repo is still "ingesting" (e.g. it was
+        deleted meanwhile), so a tombstone is never brought back.
+        """
+
+    @abstractmethod
+    def delete_repo(self, repo_id: str) -> bool:
+        """Tombstone a repo: it disappears from reads and waits for purge_repo. False if unknown."""
+
+    @abstractmethod
+    def expire_ingests(self, max_age_seconds: float) -> List[str]:
+        """Tombstone repos left "ingesting" for longer than max_age_seconds (a crashed ingest); returns their ids."""
+
+    @abstractmethod
+    def list_deleted_repos(self) -> List[str]: ...
+
+    @abstractmethod
+    def acquire_lease(self, name: str, holder: str, ttl_seconds: float) -> bool:
+        """
+        Take or renew a named lease shared by every worker (e.g. the garbage
+        collector's). True if holder has it for the next ttl_seconds.
+        """
+
+    @abstractmethod
+    def purge_repo(self, repo_id: str, batch_size: int = 1000) -> int:
+        """
+        Remove up to batch_size of a tombstoned repo's chunks (releasing
+        their bodies), else its files and edges, else the repo itself.
+        Returns how many were removed; 0 once nothing is left.
+        """
+
+    @abstractmethod
+    def get_user_repos(self, user_id: str, limit: int = None, before: str = None) -> List[dict]: ...
+
+    @abstractmethod
+    def iter_user_repos(self, user_id: str, before: str = None) -> Iterator[dict]: ...
+
+    @abstractmethod
+    def count_user_repos(self, user_id: str) -> int:
+        """How many live repos the user owns, across every page."""
+
+    # Files and dependency edges. Writes only land in a repo that is still
+    # "ingesting": once it is deleted (or promoted) they write nothing and
+    # return False, so an ingest can stop instead of feeding a tombstone.
+    @abstractmethod
+    def create_file_nodes(self, repo_id: str, paths: List[str]) -> bool: ...
+
+    @abstractmethod
+    def create_dep_relations(self, repo_id: str, edges: List[tuple]) -> bool:
+        """edges: (src_path, dst_path) pairs between files of the repo; others are skipped."""
+
+    @abstractmethod
+    def get_dependencies(self, repo_id: str, paths: List[str], depth: int = 2) -> Dict[str, List[str]]:
+        """Files reachable from each path over 1..depth outgoing DEPENDS_ON edges."""
+
+    @abstractmethod
+    def set_file_centrality(self, repo_id: str, scores: Dict[str, dict]) -> bool:
+        """scores: path -> {"pagerank", "in_degree"} (see centrality.py)."""
+
+    @abstractmethod
+    def get_file_graph(self, repo_id: str) -> Dict[str, dict]:
+        """
+        path -> {"pagerank", "in_degree", "neighbors"} for every file of the
+        repo, where neighbors are its direct DEPENDS_ON targets. Centrality
+        is 0 for files ingested before it was computed.
+        """
+
+    @abstractmethod
+    def set_file_vectors(self, repo_id: str, vectors: Dict[str, np.ndarray]) -> bool:
+        """Store one summary vector (the chunk centroid) per file."""
+
+    @abstractmethod
+    def scan_file_vectors(self, repo_id: str) -> Tuple[List[str], np.ndarray]:
+        """(paths, float32 matrix) for every file of the repo that has a vector."""
+
+    # Chunks
+    @abstractmethod
+    def insert_chunks(self, repo_id: str, rows: List[dict]) -> bool:
+        """
+        rows: dicts with id, file_path, chunk_index, hash, content, embedding.
+        Each chunk references the shared body for its content hash and bumps
+        its refcount. Content and embedding are only stored when that body is
+        new, but every row must carry them: a body returned by
+        get_body_vectors can be collected before this call and is then
+        re-created from the row. False, like the other writes, once the
+        repo is no longer being ingested.
+        """
+
+    @abstractmethod
+    def get_body_vectors(self, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Embeddings of the chunk bodies that already exist, by content hash."""
+
+    @abstractmethod
+    def scan_vectors(self, repo_id: str, paths: List[str] = None) -> Tuple[List[str], List[str], np.ndarray]:
+        """
+        Scoring phase: (chunk ids, file paths, float32 embedding matrix) for
+        every chunk of a repo, or only those in `paths`, without the chunk text.
+        """
+
+    @abstractmethod
+    def fetch_chunks(self, chunk_ids: List[str]) -> List[dict]:
+        """
+        Second phase: id, file_path, chunk_index and content for the given
+        ids, in the same order. Unknown ids are skipped.
+        """
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def create_store(backend: str = None) -> GraphStore:
+    backend = (backend or os.getenv("GRAPH_BACKEND", "neo4j")).lower()
+    if backend == "neo4j":
+        from neo4j_client import Neo4jStore
+        return Neo4jStore()
+    if backend == "memory":
+        from memory_store import MemoryStore
+        return MemoryStore(os.getenv("MEMORY_STORE_PATH"))
+    raise ValueError(f"Unknown GRAPH_BACKEND: {backend}")
+
+
+def get_store() -> GraphStore:
+    """Process-wide store for the configured backend."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_store()
+    return _store
+
+
+def set_store(store: GraphStore):
+    """Swap the process-wide store (benchmarks and tests)."""
+    global _store
+    _store = store
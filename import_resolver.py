@@ -0,0 +1,215 @@
+# import_resolver.py
+"""
+Resolve import strings to file paths in the repo.
+
+PathIndex is built once per ingest, so resolving an import costs a
+handful of hash lookups instead of scanning the file list.
+"""
+import json
+import posixpath
+import re
+from typing import Dict, List, Optional
+
+JS_EXTENSIONS = [".js", ".ts", ".jsx", ".tsx"]
+# Order matters: first hit wins, same as the original resolver
+RESOLVE_EXTENSIONS = JS_EXTENSIONS + [".py"]
+TSCONFIG_NAMES = ("tsconfig.json", "jsconfig.json")
+
+_TRAILING_COMMA_RE = re.compile(r",(\s*[}\]])")
+
+# Regex for simple Python and JS imports
+PY_IMPORT_RE = re.compile(r'^\s*(?:from\s+([\w\.]+)\s+import|import\s+([\w\.]+))', re.MULTILINE)
+# `from . import a, b` names submodules, which PY_IMPORT_RE only sees as "."
+PY_RELATIVE_NAMES_RE = re.compile(r'^\s*from\s+(\.+)\s+import\s+(?:\(([^)]*)\)|([\w ,]+))', re.MULTILINE)
+JS_IMPORT_RE = re.compile(
+    r"""^\s*(?:import\s+(?:[\w\{\}\*\s,]+)\s+from\s+['"](.+)['"]|const\s+\w+\s*=\s*require\(['"](.+)['"]\)"""
+    r"""|import\s+['"](.+?)['"]|export\s+[\w\{\}\*\s,]+\s+from\s+['"](.+?)['"])""",
+    re.MULTILINE
+)
+
+
+def detect_imports(file_path: str, text: str) -> List[str]:
+    imports = set()
+    if file_path.endswith(".py"):
+        for m in PY_IMPORT_RE.finditer(text):
+            module = m.group(1) or m.group(2)
+            if module:
+                imports.add(module)
+        for m in PY_RELATIVE_NAMES_RE.finditer(text):
+            for name in (m.group(2) or m.group(3)).split(","):
+                name = name.split()[0] if name.split() else ""
+                if name.isidentifier():
+                    imports.add(m.group(1) + name)
+    else:
+        for m in JS_IMPORT_RE.finditer(text):
+            module = next((g for g in m.groups() if g), None)
+            if module:
+                imports.add(module)
+    return list(imports)
+
+
+def parse_jsonc(text: str) -> dict:
+    """Parse JSON with // and /* */ comments and trailing commas (tsconfig style)."""
+    out = []
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i]
+        if ch == '"':
+            # Copy strings verbatim so "@/*" is not mistaken for a comment
+            j = i + 1
+            while j < n and text[j] != '"':
+                j += 2 if text[j] == "\\" else 1
+            out.append(text[i:j + 1])
+            i = j + 1
+        elif text.startswith("//", i):
+            i = text.find("\n", i)
+            i = n if i == -1 else i
+        elif text.startswith("/*", i):
+            i = text.find("*/", i + 2)
+            i = n if i == -1 else i + 2
+        else:
+            out.append(ch)
+            i += 1
+    return json.loads(_TRAILING_COMMA_RE.sub(r"\1", "".join(out)))
+
+
+def _join(*parts: str) -> str:
+    path = posixpath.normpath(posixpath.join(*parts))
+    return "" if path == "." else path
+
+
+class TsConfig:
+    """compilerOptions.baseUrl and paths from one tsconfig/jsconfig."""
+
+    def __init__(self, config_path: str, text: str):
+        self.dir = posixpath.dirname(config_path)
+        options = parse_jsonc(text).get("compilerOptions", {})
+        base_url = options.get("baseUrl")
+        self.base_url = _join(self.dir, base_url) if base_url is not None else None
+        # paths are relative to baseUrl, or to the config itself without one
+        root = self.base_url if self.base_url is not None else self.dir
+        self.paths = []
+        for pattern, targets in options.get("paths", {}).items():
+            prefix, star, suffix = pattern.partition("*")
+            self.paths.append((prefix, suffix, bool(star), [_join(root, t) for t in targets]))
+        # Longest prefix first, as TypeScript does
+        self.paths.sort(key=lambda p: len(p[0]), reverse=True)
+
+    def candidates(self, import_str: str) -> List[str]:
+        bases = []
+        for prefix, suffix, wildcard, targets in self.paths:
+            if wildcard:
+                if import_str.startswith(prefix) and import_str.endswith(suffix) \
+                        and len(import_str) >= len(prefix) + len(suffix):
+                    matched = import_str[len(prefix):len(import_str) - len(suffix)]
+                    bases.extend(t.replace("*", matched) for t in targets)
+            elif import_str == prefix:
+                bases.extend(targets)
+        if self.base_url is not None:
+            bases.append(_join(self.base_url, import_str))
+        return bases
+
+
+class PathIndex:
+    def __init__(self, paths: List[str], tsconfigs: Dict[str, str] = None):
+        self.paths = set(paths)
+
+        # "pkg.mod" -> "pkg/mod.py", "pkg" -> "pkg/__init__.py"
+        self.modules = {}
+        for path in self.paths:
+            if not path.endswith(".py"):
+                continue
+            module = path[:-3]
+            if module.endswith("/__init__"):
+                module = module[:-len("/__init__")]
+            self.modules.setdefault(module.replace("/", "."), path)
+
+        # "src/components" -> "src/components/index.tsx"
+        self.dir_index = {}
+        for ext in RESOLVE_EXTENSIONS:
+            for path in self.paths:
+                if posixpath.basename(path) == "index" + ext:
+                    self.dir_index.setdefault(posixpath.dirname(path), path)
+
+        self.tsconfigs = {}
+        for config_path, text in (tsconfigs or {}).items():
+            try:
+                self.tsconfigs[posixpath.dirname(config_path)] = TsConfig(config_path, text)
+            except (ValueError, AttributeError):
+                continue
+
+    def resolve(self, current_file: str, import_str: str) -> Optional[str]:
+        if current_file.endswith(".py"):
+            return self._resolve_python(current_file, import_str)
+        return self._resolve_js(current_file, import_str)
+
+    # Python
+
+    def _resolve_python(self, current_file: str, import_str: str) -> Optional[str]:
+        current_dir = posixpath.dirname(current_file)
+
+        if import_str.startswith("."):
+            # Package-relative: one dot is the current package, each extra dot goes up one level
+            level = len(import_str) - len(import_str.lstrip("."))
+            base = current_dir
+            for _ in range(level - 1):
+                base = posixpath.dirname(base)
+            rest = import_str[level:]
+            package = base.replace("/", ".")
+            module = f"{package}.{rest}" if package and rest else package or rest
+            # `from . import name` may name an attribute of the package itself
+            return self._lookup_module(module, len(package.split(".")) if package else 1)
+
+        # Absolute: try each ancestor of the importing file as a source root,
+        # innermost first, so src/ layouts and nested projects resolve
+        parts = current_dir.split("/") if current_dir else []
+        for i in range(len(parts), -1, -1):
+            prefix = ".".join(parts[:i])
+            module = f"{prefix}.{import_str}" if prefix else import_str
+            resolved = self._lookup_module(module, i + 1)
+            if resolved:
+                return resolved
+        return None
+
+    def _lookup_module(self, module: str, min_parts: int) -> Optional[str]:
+        # `import a.b.c` may name an attribute of a.b: fall back to shorter
+        # prefixes, but never above min_parts components
+        while module and module.count(".") + 1 >= min_parts:
+            path = self.modules.get(module)
+            if path:
+                return path
+            module, _, _ = module.rpartition(".")
+        return None
+
+    # JS / TS
+
+    def _resolve_js(self, current_file: str, import_str: str) -> Optional[str]:
+        if import_str.startswith("./") or import_str.startswith("../"):
+            return self._resolve_js_base(_join(posixpath.dirname(current_file), import_str))
+
+        config = self._nearest_tsconfig(current_file)
+        if config:
+            for base in config.candidates(import_str):
+                resolved = self._resolve_js_base(base)
+                if resolved:
+                    return resolved
+        return None
+
+    def _resolve_js_base(self, base: str) -> Optional[str]:
+        if base in self.paths:
+            return base
+        for ext in RESOLVE_EXTENSIONS:
+            if base + ext in self.paths:
+                return base + ext
+        return self.dir_index.get(base)
+
+    def _nearest_tsconfig(self, current_file: str) -> Optional[TsConfig]:
+        if not self.tsconfigs:
+            return None
+        directory = posixpath.dirname(current_file)
+        while True:
+            if directory in self.tsconfigs:
+                return self.tsconfigs[directory]
+            if not directory:
+                return None
+            directory = posixpath.dirname(directory)
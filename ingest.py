@@ -1,118 +1,50 @@
 # ingest.py
 from github_fetcher import list_files, fetch_raw
 from chunker import chunk_text_by_tokens
-from embedder import embed_texts
-from neo4j_client import (
-    driver,
-    create_file_node,
-    create_dep_relation,
-)
-from uuid import uuid4
-import re
+from embedder import embed_texts, EMBED_MODEL
+from graph_store import get_store
+from metrics import stage, CHUNKS_TOTAL
+from centrality import dependency_centrality
+from shared_index import get_index
+from import_resolver import PathIndex, TSCONFIG_NAMES, detect_imports
+import numpy as np
+import posixpath
+import hashlib
+from uuid import uuid5, NAMESPACE_URL
 from typing import List, Dict
 
-# Regex for simple Python and JS imports
-PY_IMPORT_RE = re.compile(r'^\s*(?:from\s+([\w\.]+)\s+import|import\s+([\w\.]+))', re.MULTILINE)
-JS_IMPORT_RE = re.compile(
-    r"""^\s*(?:import\s+(?:[\w\{\}\*\s,]+)\s+from\s+['"](.+)['"]|const\s+\w+\s*=\s*require\(['"](.+)['"]\))""",
-    re.MULTILINE
-)
-
-
-def detect_imports(file_path: str, text: str) -> List[str]:
-    imports = set()
-    if file_path.endswith(".py"):
-        for m in PY_IMPORT_RE.finditer(text):
-            module = m.group(1) or m.group(2)
-            if module:
-                imports.add(module)
-    else:
-        for m in JS_IMPORT_RE.finditer(text):
-            module = m.group(1) or m.group(2)
-            if module:
-                imports.add(module)
-    return list(imports)
-
-
-def insert_repo(owner: str, repo: str, branch: str = "main", user_id: str = None) -> str:
-    repo_id = str(uuid4())
-    with driver.session() as session:
-        session.run(
-            """
-            CREATE (r:Repo {id: $id, owner: $owner, repo: $repo, branch: $branch, user_id: $user_id})
-            """,
-            id=repo_id, owner=owner, repo=repo, branch=branch, user_id=user_id
-        )
-    return repo_id
-
-
-def insert_chunks(repo_id: str, rows):
-    with driver.session() as session:
-        for row in rows:
-            session.run("""
-                MATCH (r:Repo {id: $repo_id})
-                CREATE (c:Chunk {
-                    file_path: $file_path,
-                    chunk_index: $chunk_index,
-                    content: $content,
-                    embedding: $embedding
-                })
-                CREATE (r)-[:HAS_CHUNK]->(c)
-            """,
-            repo_id=repo_id,
-            file_path=row["file_path"],
-            chunk_index=row["chunk_index"],
-            content=row["content"],
-            embedding=list(row["embedding"])  # store as list
-            )
-
-
-def resolve_import_to_file(current_file: str, import_str: str, all_files: list) -> str:
-    """
-    Try to resolve an import string to an actual file path in the repo.
-    """
-    # Handle relative imports (Python)
-    if import_str.startswith("."):
-        current_dir = "/".join(current_file.split("/")[:-1])
-        relative_parts = import_str.replace(".", "/")
-        potential_path = f"{current_dir}/{relative_parts}.py"
-        if potential_path in all_files:
-            return potential_path
-    
-    # Handle relative imports (JS/TS)
-    if import_str.startswith("./") or import_str.startswith("../"):
-        current_dir = "/".join(current_file.split("/")[:-1])
-        
-        # Normalize the path
-        if import_str.startswith("./"):
-            potential_base = f"{current_dir}/{import_str[2:]}"
-        else:
-            # Handle ../
-            parts = current_dir.split("/")
-            up_count = import_str.count("../")
-            remaining = import_str.replace("../", "", up_count)
-            base_dir = "/".join(parts[:-up_count]) if up_count < len(parts) else ""
-            potential_base = f"{base_dir}/{remaining}" if base_dir else remaining
-        
-        # Try different extensions
-        for ext in [".js", ".ts", ".jsx", ".tsx", ".py"]:
-            potential_path = potential_base + ext
-            if potential_path in all_files:
-                return potential_path
-            
-            # Also try with /index
-            potential_index = f"{potential_base}/index{ext}"
-            if potential_index in all_files:
-                return potential_index
-    
-    # Handle Python module imports (convert module path to file path)
-    if not ("/" in import_str or import_str.startswith(".")):
-        # Try to find a matching file
-        potential_path = import_str.replace(".", "/") + ".py"
-        if potential_path in all_files:
-            return potential_path
-    
-    return None
+
+def chunk_id(repo_id: str, path: str, chunk_index: int) -> str:
+    """Deterministic chunk id, identical across store backends."""
+    return str(uuid5(NAMESPACE_URL, f"{repo_id}/{path}#{chunk_index}"))
+
+
+def content_hash(text: str) -> str:
+    """Key of the shared chunk body. The model is part of it: its embedding is too."""
+    return hashlib.sha256(f"{EMBED_MODEL}\n{text}".encode()).hexdigest()
+
+
+# File vectors are buffered and written this many files at a time
+FILE_VECTOR_BATCH = 100
+
+
+def file_centroid(embeddings) -> np.ndarray:
+    """Unit-length mean of a file's chunk embeddings."""
+    centroid = np.asarray(embeddings, dtype=np.float32).mean(axis=0)
+    norm = np.linalg.norm(centroid)
+    return centroid / norm if norm else centroid
+
+
+def load_tsconfigs(owner: str, repo: str, branch: str, files: List[str]) -> Dict[str, str]:
+    """Fetch every tsconfig.json/jsconfig.json so path aliases can be resolved."""
+    configs = {}
+    for path in files:
+        if posixpath.basename(path) in TSCONFIG_NAMES:
+            try:
+                configs[path] = fetch_raw(owner, repo, path, branch)
+            except Exception as e:
+                print(f"⚠️  Could not fetch {path}: {e}")
+    return configs
 
 
 # At the top of ingest.py
@@ -154,56 +86,142 @@ def should_process_file(path: str) -> bool:
     return any(path.endswith(ext) for ext in SUPPORTED_EXTENSIONS)
 
 
-def ingest_repo(owner: str, repo: str, branch: str = "main", user_id: str = None) -> str:
-    repo_id = insert_repo(owner, repo, branch, user_id)
-    files = list_files(owner, repo, branch)
+def ingest_repo(owner: str, repo: str, branch: str = "main", user_id: str = None) -> dict:
+    """
+    Returns a summary: repo_id, files, chunks, new_bodies (chunk bodies
+    embedded and stored by this run), dedupe_ratio (share of chunks whose
+    body already existed) and replaced (ids of the earlier ingests of the
+    same user/owner/repo/branch, now tombstoned for garbage collection).
+
+    The new copy is written alongside the live one under a new repo_id
+    and only swapped in once complete, so queries never see a half-ingested
+    repo. The replaced ids stop resolving: reads and the API treat them as
+    unknown (404) while the garbage collector purges them.
+    """
+    store = get_store()
+    repo_id = store.insert_repo(owner, repo, branch, user_id)
+    try:
+        summary = ingest_files(store, repo_id, owner, repo, branch)
+        # Raises if the repo was deleted while we were writing it
+        summary["replaced"] = store.promote_repo(repo_id)
+    except Exception:
+        # Don't leave a partial copy behind; the garbage collector purges it
+        store.delete_repo(repo_id)
+        raise
+    if get_index() is not None:
+        for old_id in summary["replaced"]:
+            get_index().drop(old_id)
+        get_index().warm(repo_id)
+    return summary
+
+
+def check_written(accepted: bool, repo_id: str):
+    # The store rejects writes once the repo is deleted (or expired) mid-ingest;
+    # stop there rather than fetching and embedding the rest for nothing
+    if not accepted:
+        raise ValueError(f"Repo {repo_id} was deleted during ingest")
+
+
+def ingest_files(store, repo_id: str, owner: str, repo: str, branch: str) -> dict:
+    with stage("fetch"):
+        files = list_files(owner, repo, branch)
     
     print(f"Found {len(files)} total files in repo")
 
     # First pass: create all file nodes
-    code_files = []
-    for path in files:
-        if not should_process_file(path):
-            continue
-        code_files.append(path)
-        create_file_node(repo_id, path)
+    code_files = [path for path in files if should_process_file(path)]
+    with stage("graph_write"):
+        check_written(store.create_file_nodes(repo_id, code_files), repo_id)
     
     print(f"Processing {len(code_files)} code files")
 
+    # Built once so each import resolves in O(1) lookups
+    with stage("fetch"):
+        tsconfigs = load_tsconfigs(owner, repo, branch, code_files)
+    path_index = PathIndex(code_files, tsconfigs)
+
     # Second pass: process content and create dependencies
+    file_vectors = {}
+    all_edges = []
+    total_chunks = new_bodies = 0
     for i, path in enumerate(code_files):
         print(f"Processing {i+1}/{len(code_files)}: {path}")
         
         try:
-            text = fetch_raw(owner, repo, path, branch)
+            with stage("fetch"):
+                text = fetch_raw(owner, repo, path, branch)
         except Exception as e:
             print(f"❌ Fetch error {path}: {e}")
             continue
 
         # Create chunks
-        chunks = chunk_text_by_tokens(text, max_tokens=400, overlap=50)
+        with stage("chunk"):
+            chunks = chunk_text_by_tokens(text, max_tokens=400, overlap=50)
         if not chunks:
             print(f"⚠️  No chunks created for {path}")
             continue
 
         print(f"✓ Created {len(chunks)} chunks for {path}")
 
-        embeddings = embed_texts(chunks)
+        # Only embed bodies no ingest has stored yet (other branches, forks, repeated files)
+        hashes = [content_hash(chunk) for chunk in chunks]
+        with stage("body_lookup"):
+            known = store.get_body_vectors(list(set(hashes)))
+        missing = list(dict.fromkeys(h for h, chunk in zip(hashes, chunks) if h not in known))
+        if missing:
+            text_by_hash = dict(zip(hashes, chunks))
+            fresh = dict(zip(missing, embed_texts([text_by_hash[h] for h in missing])))
+        else:
+            fresh = {}
+        embeddings = [fresh[h] if h in fresh else known[h] for h in hashes]
         rows = [
-            {"file_path": path, "chunk_index": i, "content": chunk, "embedding": emb}
-            for i, (chunk, emb) in enumerate(zip(chunks, embeddings))
+            {"id": chunk_id(repo_id, path, i), "file_path": path, "chunk_index": i, "hash": h,
+             "content": chunk, "embedding": embedding}
+            for i, (chunk, h, embedding) in enumerate(zip(chunks, hashes, embeddings))
         ]
-        insert_chunks(repo_id, rows)
+        with stage("graph_write"):
+            check_written(store.insert_chunks(repo_id, rows), repo_id)
+        CHUNKS_TOTAL.inc(len(rows))
+        total_chunks += len(rows)
+        new_bodies += len(missing)
+
+        file_vectors[path] = file_centroid(embeddings)
+        if len(file_vectors) >= FILE_VECTOR_BATCH:
+            with stage("graph_write"):
+                check_written(store.set_file_vectors(repo_id, file_vectors), repo_id)
+            file_vectors = {}
 
         # Detect imports & create dependency relations
         imports = detect_imports(path, text)
         if imports:
             print(f"  Found {len(imports)} imports: {imports[:3]}...")
+            edges = []
             for module in imports:
-                resolved_path = resolve_import_to_file(path, module, code_files)
-                if resolved_path:
-                    create_dep_relation(repo_id, path, resolved_path)
+                resolved_path = path_index.resolve(path, module)
+                if resolved_path and resolved_path != path:
+                    edges.append((path, resolved_path))
                     print(f"  ✓ Created dependency: {path} -> {resolved_path}")
-
-    print(f"✅ Ingestion complete for {repo_id}")
-    return repo_id
\ No newline at end of file
+            if edges:
+                with stage("graph_write"):
+                    check_written(store.create_dep_relations(repo_id, edges), repo_id)
+                all_edges.extend(edges)
+
+    if file_vectors:
+        with stage("graph_write"):
+            check_written(store.set_file_vectors(repo_id, file_vectors), repo_id)
+
+    # Centrality needs the whole dependency graph, so it runs last
+    with stage("centrality"):
+        scores = dependency_centrality(code_files, all_edges)
+    with stage("graph_write"):
+        check_written(store.set_file_centrality(repo_id, scores), repo_id)
+
+    dedupe_ratio = round(1 - new_bodies / total_chunks, 4) if total_chunks else 0.0
+    print(f"✅ Ingestion complete for {repo_id}: {total_chunks} chunks, {new_bodies} new bodies (dedupe {dedupe_ratio:.1%})")
+    return {
+        "repo_id": repo_id,
+        "files": len(code_files),
+        "chunks": total_chunks,
+        "new_bodies": new_bodies,
+        "dedupe_ratio": dedupe_ratio,
+    }
\ No newline at end of file
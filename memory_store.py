@@ -0,0 +1,542 @@
+# memory_store.py
+"""
+In-process GraphStore: no database hop, suitable for single-node
+deployments and offline benchmarks.
+
+Chunk embeddings live in one contiguous float32 matrix per repo (grown
+by doubling), dependency edges in per-file adjacency sets. Chunk text
+and embeddings are persisted once per content hash (chunk_bodies), with
+a refcount of the chunks using them. Pass a path to write every
+mutation through to SQLite and reload it on startup.
+"""
+import bisect
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from uuid import uuid4
+import numpy as np
+
+from graph_store import GraphStore
+
+
+class ChunkTable:
+    """Column-oriented chunk storage for one repo."""
+
+    def __init__(self):
+        self.ids = []
+        self.file_paths = []
+        self.chunk_index = []
+        self.content = []
+        self.hashes = []
+        self.rows_by_file = defaultdict(list)
+        self._embeddings = None
+        self.size = 0
+
+    def append(self, ids, file_paths, chunk_index, content, hashes, embeddings: np.ndarray):
+        n = len(ids)
+        if self._embeddings is None:
+            self._embeddings = np.empty((max(n, 64), embeddings.shape[1]), dtype=np.float32)
+        elif self.size + n > len(self._embeddings):
+            grown = np.empty((max(2 * len(self._embeddings), self.size + n), self._embeddings.shape[1]), dtype=np.float32)
+            grown[:self.size] = self._embeddings[:self.size]
+            self._embeddings = grown
+        self._embeddings[self.size:self.size + n] = embeddings
+        for i, path in enumerate(file_paths):
+            self.rows_by_file[path].append(self.size + i)
+        self.ids.extend(ids)
+        self.file_paths.extend(file_paths)
+        self.chunk_index.extend(chunk_index)
+        self.content.extend(content)
+        self.hashes.extend(hashes)
+        self.size += n
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        if self._embeddings is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._embeddings[:self.size]
+
+
+class MemoryStore(GraphStore):
+    def __init__(self, path: str = None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._db = None
+
+        self.users = {}             # user_id -> {"user_id", "email", "password"}
+        self.user_ids_by_email = {}
+        self.sorted_user_ids = []
+        self.repos = {}             # repo_id -> {"id", "owner", "repo", "branch", "user_id", "status", "generation", "started_at"}
+        self.repo_ids_by_user = defaultdict(list)   # sorted ascending, live repos only
+        self.purging = {}           # tombstoned repo_id -> what is left to purge
+        self.files = defaultdict(set)               # repo_id -> {path}
+        self.deps = defaultdict(lambda: defaultdict(set))  # repo_id -> src -> {dst}
+        self.chunks = defaultdict(ChunkTable)
+        self.chunk_locations = {}   # chunk id -> (repo_id, row in that repo's ChunkTable)
+        self.bodies = {}            # content hash -> {"content", "embedding", "refcount"}
+        self.file_centrality = defaultdict(dict)    # repo_id -> path -> (pagerank, in_degree)
+        self.file_vectors = defaultdict(dict)       # repo_id -> path -> centroid
+        self._file_matrix = {}                      # repo_id -> (paths, matrix), rebuilt lazily
+
+    # Lifecycle
+
+    def setup(self):
+        if self.path and self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, email TEXT UNIQUE, password TEXT);
+                CREATE TABLE IF NOT EXISTS repos (id TEXT PRIMARY KEY, owner TEXT, repo TEXT, branch TEXT, user_id TEXT);
+                CREATE TABLE IF NOT EXISTS files (repo_id TEXT, path TEXT, PRIMARY KEY (repo_id, path));
+                CREATE TABLE IF NOT EXISTS deps (repo_id TEXT, src TEXT, dst TEXT, PRIMARY KEY (repo_id, src, dst));
+                CREATE TABLE IF NOT EXISTS file_centrality (repo_id TEXT, path TEXT, pagerank REAL, in_degree INTEGER, PRIMARY KEY (repo_id, path));
+                CREATE TABLE IF NOT EXISTS file_vectors (repo_id TEXT, path TEXT, vector BLOB, PRIMARY KEY (repo_id, path));
+                CREATE TABLE IF NOT EXISTS chunk_bodies (hash TEXT PRIMARY KEY, content TEXT, embedding BLOB, refcount INTEGER);
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id TEXT PRIMARY KEY, repo_id TEXT, file_path TEXT, chunk_index INTEGER,
+                    content TEXT, embedding BLOB
+                );
+            """)
+            # Chunks now reference a body by hash; older rows keep their own content and embedding
+            self._add_column("chunks", "hash", "TEXT")
+            self._add_column("repos", "status", "TEXT")
+            self._add_column("repos", "generation", "INTEGER")
+            self._add_column("repos", "started_at", "REAL")
+            self._load()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _add_column(self, table: str, column: str, decl: str):
+        if column not in [c[1] for c in self._db.execute(f"PRAGMA table_info({table})")]:
+            self._db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+    def _persist(self, sql: str, rows: list):
+        if self._db is not None:
+            self._db.executemany(sql, rows)
+            self._db.commit()
+
+    def _load(self):
+        db = self._db
+        for user_id, email, password in db.execute("SELECT user_id, email, password FROM users"):
+            self._add_user(user_id, email, password)
+        query = "SELECT id, owner, repo, branch, user_id, status, generation, started_at FROM repos"
+        for repo_id, owner, repo, branch, user_id, status, generation, started_at in db.execute(query):
+            self._add_repo(repo_id, owner, repo, branch, user_id, status or "ready", generation or 0, started_at or 0.0)
+        for repo_id, path in db.execute("SELECT repo_id, path FROM files"):
+            self.files[repo_id].add(path)
+        for repo_id, src, dst in db.execute("SELECT repo_id, src, dst FROM deps"):
+            self.deps[repo_id][src].add(dst)
+        for repo_id, path, pagerank, in_degree in db.execute("SELECT repo_id, path, pagerank, in_degree FROM file_centrality"):
+            self.file_centrality[repo_id][path] = (pagerank, in_degree)
+        for repo_id, path, vector in db.execute("SELECT repo_id, path, vector FROM file_vectors"):
+            self.file_vectors[repo_id][path] = np.frombuffer(vector, dtype=np.float32)
+
+        for content_hash, content, embedding, refcount in db.execute("SELECT hash, content, embedding, refcount FROM chunk_bodies"):
+            self.bodies[content_hash] = {
+                "content": content, "embedding": np.frombuffer(embedding, dtype=np.float32), "refcount": refcount
+            }
+
+        by_repo = defaultdict(list)
+        query = "SELECT id, repo_id, file_path, chunk_index, content, embedding, hash FROM chunks ORDER BY rowid"
+        for chunk_id, repo_id, file_path, chunk_index, content, embedding, content_hash in db.execute(query):
+            body = self.bodies.get(content_hash)
+            if body is not None:
+                content, embedding = body["content"], body["embedding"]
+            elif embedding is not None:
+                embedding = np.frombuffer(embedding, dtype=np.float32)
+            else:
+                continue
+            by_repo[repo_id].append((chunk_id, file_path, chunk_index, content, content_hash, embedding))
+        for repo_id, rows in by_repo.items():
+            self._append_chunks(
+                repo_id,
+                [r[0] for r in rows],
+                [r[1] for r in rows],
+                [r[2] for r in rows],
+                [r[3] for r in rows],
+                [r[4] for r in rows],
+                np.stack([r[5] for r in rows]),
+            )
+        for repo_id, repo in self.repos.items():
+            if repo["status"] == "deleted":
+                self._detach(repo_id)
+
+    # Users
+
+    def _add_user(self, user_id, email, password):
+        self.users[user_id] = {"user_id": user_id, "email": email, "password": password}
+        self.user_ids_by_email[email] = user_id
+        bisect.insort(self.sorted_user_ids, user_id)
+
+    def create_user(self, email, hashed_pw):
+        user_id = str(uuid4())
+        with self._lock:
+            # Same upsert-on-email semantics as the Neo4j MERGE
+            previous = self.user_ids_by_email.get(email)
+            if previous:
+                del self.users[previous]
+                self.sorted_user_ids.remove(previous)
+                self._persist("DELETE FROM users WHERE user_id = ?", [(previous,)])
+            self._add_user(user_id, email, hashed_pw)
+            self._persist("INSERT INTO users VALUES (?, ?, ?)", [(user_id, email, hashed_pw)])
+        return user_id
+
+    def get_user_by_email(self, email):
+        user = self.users.get(self.user_ids_by_email.get(email))
+        if user:
+            return {"user_id": user["user_id"], "password": user["password"]}
+        return None
+
+    def get_user_by_email_or_id(self, identifier):
+        user = self.users.get(identifier) or self.users.get(self.user_ids_by_email.get(identifier))
+        return dict(user) if user else None
+
+    def list_users(self, limit=None, after=None):
+        return list(self._iter_users(after, limit))
+
+    def iter_users(self, after=None):
+        return self._iter_users(after)
+
+    def _iter_users(self, after=None, limit=None):
+        ids = self.sorted_user_ids
+        start = bisect.bisect_right(ids, after) if after is not None else 0
+        end = len(ids) if limit is None else min(len(ids), start + limit)
+        for user_id in ids[start:end]:
+            user = self.users[user_id]
+            yield {"user_id": user["user_id"], "email": user["email"]}
+
+    # Repos
+
+    def _add_repo(self, repo_id, owner, repo, branch, user_id, status, generation=0, started_at=0.0):
+        self.repos[repo_id] = {
+            "id": repo_id, "owner": owner, "repo": repo, "branch": branch, "user_id": user_id,
+            "status": status, "generation": generation, "started_at": started_at,
+        }
+        # Only live repos are listed; promote_repo adds a finished ingest
+        if user_id is not None and status == "ready":
+            bisect.insort(self.repo_ids_by_user[user_id], repo_id)
+
+    def _writable(self, repo_id) -> bool:
+        repo = self.repos.get(repo_id)
+        return repo is not None and repo["status"] != "deleted"
+
+    def _ingesting(self, repo_id) -> bool:
+        # Files, edges, vectors and chunks are only written by a running ingest
+        repo = self.repos.get(repo_id)
+        return repo is not None and repo["status"] == "ingesting"
+
+    def insert_repo(self, owner, repo, branch="main", user_id=None):
+        repo_id = str(uuid4())
+        started_at = time.time()
+        with self._lock:
+            self._add_repo(repo_id, owner, repo, branch, user_id, "ingesting", started_at=started_at)
+            self._persist("INSERT INTO repos (id, owner, repo, branch, user_id, status, generation, started_at) "
+                          "VALUES (?, ?, ?, ?, ?, ?, 0, ?)",
+                          [(repo_id, owner, repo, branch, user_id, "ingesting", started_at)])
+        return repo_id
+
+    def get_repo_metadata(self, repo_id):
+        repo = self.repos.get(repo_id)
+        if repo is None or repo["status"] == "deleted":
+            raise ValueError(f"No repo found with id {repo_id}")
+        return {"owner": repo["owner"], "repo_name": repo["repo"], "branch": repo["branch"],
+                "user_id": repo["user_id"], "status": repo["status"]}
+
+    def get_repo_statuses(self, repo_ids):
+        return {r: self.repos[r]["status"] for r in repo_ids if r in self.repos}
+
+    # Repo lifecycle: tombstone first, purge in batches later
+
+    def promote_repo(self, repo_id):
+        with self._lock:
+            repo = self.repos.get(repo_id)
+            if repo is None or repo["status"] != "ingesting":
+                raise ValueError(f"Repo {repo_id} is not being ingested")
+            key = (repo["user_id"], repo["owner"], repo["repo"], repo["branch"])
+            previous = [
+                r for r in self.repos.values()
+                if r["id"] != repo_id and r["status"] == "ready"
+                and (r["user_id"], r["owner"], r["repo"], r["branch"]) == key
+            ]
+            repo["status"] = "ready"
+            repo["generation"] = max((r["generation"] + 1 for r in previous), default=0)
+            if repo["user_id"] is not None:
+                bisect.insort(self.repo_ids_by_user[repo["user_id"]], repo_id)
+            self._persist("UPDATE repos SET status = ?, generation = ? WHERE id = ?",
+                          [("ready", repo["generation"], repo_id)])
+            for r in previous:
+                self.delete_repo(r["id"])
+            return [r["id"] for r in previous]
+
+    def delete_repo(self, repo_id):
+        with self._lock:
+            if not self._writable(repo_id):
+                return False
+            repo = self.repos[repo_id]
+            repo["status"] = "deleted"
+            if repo["user_id"] is not None:
+                ids = self.repo_ids_by_user[repo["user_id"]]
+                i = bisect.bisect_left(ids, repo_id)
+                if i < len(ids) and ids[i] == repo_id:
+                    del ids[i]
+            self._detach(repo_id)
+            self._persist("UPDATE repos SET status = ? WHERE id = ?", [("deleted", repo_id)])
+            return True
+
+    def _detach(self, repo_id):
+        # O(1) under the lock: reads stop seeing the repo, purge_repo does the rest
+        self.purging[repo_id] = {
+            "chunks": self.chunks.pop(repo_id, None),
+            "next_row": 0,
+            "files": sorted(self.files.pop(repo_id, ())),
+        }
+        self.deps.pop(repo_id, None)
+        self.file_vectors.pop(repo_id, None)
+        self.file_centrality.pop(repo_id, None)
+        self._file_matrix.pop(repo_id, None)
+
+    def expire_ingests(self, max_age_seconds):
+        cutoff = time.time() - max_age_seconds
+        with self._lock:
+            stale = [r["id"] for r in self.repos.values() if r["status"] == "ingesting" and r["started_at"] < cutoff]
+            for repo_id in stale:
+                self.delete_repo(repo_id)
+        return stale
+
+    def acquire_lease(self, name, holder, ttl_seconds):
+        # The memory backend is per-process, so its one collector never competes
+        return True
+
+    def list_deleted_repos(self):
+        with self._lock:
+            return list(self.purging)
+
+    def purge_repo(self, repo_id, batch_size=1000):
+        with self._lock:
+            state = self.purging.get(repo_id)
+            if state is None:
+                return 0
+
+            table = state["chunks"]
+            if table is not None and state["next_row"] < table.size:
+                start = state["next_row"]
+                end = min(start + batch_size, table.size)
+                state["next_row"] = end
+                released, dropped = {}, []
+                for i in range(start, end):
+                    self.chunk_locations.pop(table.ids[i], None)
+                    body = self.bodies.get(table.hashes[i])
+                    if body is not None:
+                        body["refcount"] -= 1
+                        released[table.hashes[i]] = body["refcount"]
+                for h, refcount in released.items():
+                    if refcount <= 0:
+                        del self.bodies[h]
+                        dropped.append(h)
+                self._persist("DELETE FROM chunks WHERE id = ?", [(table.ids[i],) for i in range(start, end)])
+                self._persist("UPDATE chunk_bodies SET refcount = ? WHERE hash = ?",
+                              [(refcount, h) for h, refcount in released.items() if refcount > 0])
+                self._persist("DELETE FROM chunk_bodies WHERE hash = ?", [(h,) for h in dropped])
+                return end - start
+
+            if state["files"]:
+                batch, state["files"] = state["files"][:batch_size], state["files"][batch_size:]
+                rows = [(repo_id, p) for p in batch]
+                self._persist("DELETE FROM deps WHERE repo_id = ? AND src = ?", rows)
+                self._persist("DELETE FROM file_vectors WHERE repo_id = ? AND path = ?", rows)
+                self._persist("DELETE FROM file_centrality WHERE repo_id = ? AND path = ?", rows)
+                self._persist("DELETE FROM files WHERE repo_id = ? AND path = ?", rows)
+                return len(batch)
+
+            del self.purging[repo_id]
+            del self.repos[repo_id]
+            self._persist("DELETE FROM repos WHERE id = ?", [(repo_id,)])
+            return 1
+
+    def get_user_repos(self, user_id, limit=None, before=None):
+        return list(self._iter_user_repos(user_id, before, limit))
+
+    def iter_user_repos(self, user_id, before=None):
+        return self._iter_user_repos(user_id, before)
+
+    def count_user_repos(self, user_id):
+        return len(self.repo_ids_by_user.get(user_id, ()))
+
+    def _iter_user_repos(self, user_id, before=None, limit=None):
+        ids = self.repo_ids_by_user.get(user_id, [])
+        end = bisect.bisect_left(ids, before) if before is not None else len(ids)
+        start = 0 if limit is None else max(0, end - limit)
+        for repo_id in reversed(ids[start:end]):
+            repo = self.repos[repo_id]
+            yield {"id": repo["id"], "owner": repo["owner"], "repo": repo["repo"], "branch": repo["branch"]}
+
+    # Files and dependency edges
+
+    def create_file_nodes(self, repo_id, paths):
+        with self._lock:
+            if not self._ingesting(repo_id):
+                return False
+            new = [p for p in paths if p not in self.files[repo_id]]
+            self.files[repo_id].update(new)
+            self._persist("INSERT INTO files VALUES (?, ?)", [(repo_id, p) for p in new])
+            return True
+
+    def create_dep_relations(self, repo_id, edges):
+        with self._lock:
+            if not self._ingesting(repo_id):
+                return False
+            files = self.files[repo_id]
+            adjacency = self.deps[repo_id]
+            new = [(src, dst) for src, dst in edges
+                   if src in files and dst in files and dst not in adjacency[src]]
+            for src, dst in new:
+                adjacency[src].add(dst)
+            self._persist("INSERT INTO deps VALUES (?, ?, ?)", [(repo_id, src, dst) for src, dst in new])
+            return True
+
+    def get_dependencies(self, repo_id, paths, depth=2):
+        adjacency = self.deps.get(repo_id, {})
+        files = self.files.get(repo_id, set())
+        neighbors = {p: [] for p in paths}
+        for path in paths:
+            if path not in files:
+                continue
+            seen = set()
+            frontier = [path]
+            for _ in range(depth):
+                frontier = [n for p in frontier for n in adjacency.get(p, ()) if n not in seen]
+                seen.update(frontier)
+            neighbors[path] = sorted(seen)
+        return neighbors
+
+    def set_file_centrality(self, repo_id, scores):
+        with self._lock:
+            if not self._ingesting(repo_id):
+                return False
+            files = self.files[repo_id]
+            rows = [(p, s["pagerank"], s["in_degree"]) for p, s in scores.items() if p in files]
+            self.file_centrality[repo_id].update((p, (pr, deg)) for p, pr, deg in rows)
+            self._persist("INSERT OR REPLACE INTO file_centrality VALUES (?, ?, ?, ?)",
+                          [(repo_id,) + row for row in rows])
+            return True
+
+    def get_file_graph(self, repo_id):
+        with self._lock:
+            adjacency = self.deps.get(repo_id, {})
+            centrality = self.file_centrality.get(repo_id, {})
+            graph = {}
+            for path in self.files.get(repo_id, ()):
+                pagerank, in_degree = centrality.get(path, (0.0, 0))
+                graph[path] = {"pagerank": pagerank, "in_degree": in_degree,
+                               "neighbors": sorted(adjacency.get(path, ()))}
+            return graph
+
+    def set_file_vectors(self, repo_id, vectors):
+        with self._lock:
+            if not self._ingesting(repo_id):
+                return False
+            files = self.files[repo_id]
+            vectors = {p: np.asarray(v, dtype=np.float32) for p, v in vectors.items() if p in files}
+            self.file_vectors[repo_id].update(vectors)
+            self._file_matrix.pop(repo_id, None)
+            self._persist("INSERT OR REPLACE INTO file_vectors VALUES (?, ?, ?)",
+                          [(repo_id, p, v.tobytes()) for p, v in vectors.items()])
+            return True
+
+    def scan_file_vectors(self, repo_id):
+        with self._lock:
+            cached = self._file_matrix.get(repo_id)
+            if cached is None:
+                vectors = self.file_vectors.get(repo_id, {})
+                paths = list(vectors)
+                matrix = np.stack([vectors[p] for p in paths]) if paths else np.empty((0, 0), dtype=np.float32)
+                cached = self._file_matrix[repo_id] = (paths, matrix)
+            return cached
+
+    # Chunks
+
+    def _append_chunks(self, repo_id, ids, file_paths, chunk_index, content, hashes, embeddings):
+        table = self.chunks[repo_id]
+        offset = table.size
+        table.append(ids, file_paths, chunk_index, content, hashes, embeddings)
+        for i, chunk_id in enumerate(ids):
+            self.chunk_locations[chunk_id] = (repo_id, offset + i)
+
+    def insert_chunks(self, repo_id, rows):
+        with self._lock:
+            if not self._ingesting(repo_id):
+                return False
+            files = self.files[repo_id]
+            new_bodies, kept = {}, []
+            for row in rows:
+                if row["file_path"] not in files:
+                    continue
+                body = self.bodies.get(row["hash"])
+                if body is None:
+                    # New, or collected since the caller looked it up
+                    body = self.bodies[row["hash"]] = new_bodies[row["hash"]] = {
+                        "content": row["content"],
+                        "embedding": np.asarray(row["embedding"], dtype=np.float32),
+                        "refcount": 0,
+                    }
+                body["refcount"] += 1
+                kept.append((row, body))
+            if not kept:
+                return True
+            # The scan matrix keeps its own contiguous copy of each vector;
+            # content strings and the persisted bodies are shared
+            self._append_chunks(
+                repo_id,
+                [row["id"] for row, _ in kept],
+                [row["file_path"] for row, _ in kept],
+                [row["chunk_index"] for row, _ in kept],
+                [body["content"] for _, body in kept],
+                [row["hash"] for row, _ in kept],
+                np.stack([body["embedding"] for _, body in kept]),
+            )
+            self._persist("INSERT INTO chunk_bodies VALUES (?, ?, ?, 0)", [
+                (h, b["content"], b["embedding"].tobytes()) for h, b in new_bodies.items()
+            ])
+            touched = {row["hash"] for row, _ in kept}
+            self._persist("UPDATE chunk_bodies SET refcount = ? WHERE hash = ?",
+                          [(self.bodies[h]["refcount"], h) for h in touched])
+            self._persist("INSERT INTO chunks (id, repo_id, file_path, chunk_index, hash) VALUES (?, ?, ?, ?, ?)", [
+                (row["id"], repo_id, row["file_path"], row["chunk_index"], row["hash"]) for row, _ in kept
+            ])
+            return True
+
+    def get_body_vectors(self, hashes):
+        with self._lock:
+            return {h: self.bodies[h]["embedding"] for h in hashes if h in self.bodies}
+
+    def scan_vectors(self, repo_id, paths=None):
+        table = self.chunks.get(repo_id)
+        if table is None:
+            return [], [], np.empty((0, 0), dtype=np.float32)
+        with self._lock:
+            if paths is None:
+                n = table.size
+                return table.ids[:n], table.file_paths[:n], table.embeddings[:n]
+            rows = [i for p in paths for i in table.rows_by_file.get(p, ())]
+            return [table.ids[i] for i in rows], [table.file_paths[i] for i in rows], table.embeddings[rows]
+
+    def fetch_chunks(self, chunk_ids):
+        rows = []
+        for chunk_id in chunk_ids:
+            location = self.chunk_locations.get(chunk_id)
+            if location is None:
+                continue
+            table = self.chunks.get(location[0])
+            if table is None:
+                continue
+            i = location[1]
+            rows.append({
+                "id": chunk_id,
+                "file_path": table.file_paths[i],
+                "chunk_index": table.chunk_index[i],
+                "content": table.content[i]
+            })
+        return rows
@@ -0,0 +1,160 @@
+# metrics.py
+"""
+Lightweight pipeline instrumentation exposed in Prometheus text format.
+
+Set METRICS_ENABLED=1 to record. When disabled, stage() hands back a
+shared no-op context manager and counters return immediately, unless a
+per-request profile (see profile()) is active on the current context.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+ENABLED = os.getenv("METRICS_ENABLED", "").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_NOOP = nullcontext()
+_profile = ContextVar("profile", default=None)
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{v}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, *label_values):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        for label_values, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *label_values):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}   # label_values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *label_values):
+        if not ENABLED:
+            return
+        with self._lock:
+            series = self._series.setdefault(label_values, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        for label_values, series in sorted(self._series.items()):
+            for bound, count in zip(self.buckets + ("+Inf",), series[:len(self.buckets)] + [series[-1]]):
+                labels = _format_labels(self.labels + ("le",), label_values + (bound,))
+                yield f"{self.name}_bucket{labels} {count}"
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {series[-2]}"
+            yield f"{self.name}_count{labels} {series[-1]}"
+
+
+REGISTRY = []
+
+STAGE_SECONDS = Histogram("syntaxnote_stage_seconds", "Latency of each pipeline stage.", ("stage",))
+CHUNKS_TOTAL = Counter("syntaxnote_chunks_total", "Chunks written during ingestion.")
+TOKENS_TOTAL = Counter("syntaxnote_openai_tokens_total", "OpenAI tokens consumed.", ("kind",))
+CACHE_REQUESTS = Counter("syntaxnote_cache_requests_total", "Cache lookups.", ("cache", "result"))
+GC_REMOVED_TOTAL = Counter("syntaxnote_gc_removed_total", "Chunks, files and repos removed by the garbage collector.")
+GITHUB_RATE_LIMIT_REMAINING = Gauge("syntaxnote_github_rate_limit_remaining", "Last X-RateLimit-Remaining seen from GitHub.")
+
+
+class _StageTimer:
+    __slots__ = ("name", "profile", "start")
+
+    def __init__(self, name: str, profile: dict):
+        self.name = name
+        self.profile = profile
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        STAGE_SECONDS.observe(elapsed, self.name)
+        if self.profile is not None:
+            self.profile[self.name] = self.profile.get(self.name, 0) + elapsed
+        return False
+
+
+def stage(name: str):
+    """Time a block: `with stage("embed"): ...`."""
+    profile = _profile.get()
+    if not ENABLED and profile is None:
+        return _NOOP
+    return _StageTimer(name, profile)
+
+
+@contextmanager
+def profile(enabled: bool = True):
+    """
+    Collect a per-stage breakdown for everything timed in this context,
+    whether or not METRICS_ENABLED is set. Yields a dict that is filled
+    in with milliseconds per stage (plus total_ms) when the block exits.
+    """
+    if not enabled:
+        yield None
+        return
+    stages = {}
+    token = _profile.set(stages)
+    start = time.perf_counter()
+    report = {}
+    try:
+        yield report
+    finally:
+        _profile.reset(token)
+        report["stages_ms"] = {k: round(v * 1000, 3) for k, v in stages.items()}
+        report["total_ms"] = round((time.perf_counter() - start) * 1000, 3)
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
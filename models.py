@@ -1,6 +1,6 @@
 # models.py
 from pydantic import BaseModel, Field, constr
-from typing import List, Optional
+from typing import List, Literal, Optional
 from uuid import UUID
 
 class RegisterRequest(BaseModel):
@@ -29,6 +29,21 @@ class FileChunk(BaseModel):
     embedding: List[float]
 
 class QueryRequest(BaseModel):
-    repo_id: UUID
+    # Scope: one repo, a list of repos, or (with a bearer token) every repo the caller owns
+    repo_id: Optional[UUID] = None
+    repo_ids: Optional[List[UUID]] = Field(default=None, max_length=200)
+    my_repos: bool = False
     question: str
     top_k: int = Field(default=5, ge=1, le=25)
+    # Override RETRIEVAL_MODE / TOP_FILES for this request
+    mode: Optional[Literal["flat", "hierarchical"]] = None
+    top_files: Optional[int] = Field(default=None, ge=1, le=500)
+
+class BatchQueryRequest(BaseModel):
+    repo_id: UUID
+    questions: List[constr(min_length=1)] = Field(..., min_length=1, max_length=50)
+    top_k: int = Field(default=5, ge=1, le=25)
+    mode: Optional[Literal["flat", "hierarchical"]] = None
+    top_files: Optional[int] = Field(default=None, ge=1, le=500)
+    # Concurrent chat completions for this batch; BATCH_MAX_PARALLEL when unset
+    max_parallel: Optional[int] = Field(default=None, ge=1, le=16)
@@ -1,8 +1,12 @@
 # neo4j_client.py
 import os
+import threading
+import time
 from uuid import uuid4
+import numpy as np
 from neo4j import GraphDatabase
 from dotenv import load_dotenv
+from graph_store import GraphStore
 
 load_dotenv()
 
@@ -10,11 +14,28 @@ URI = os.getenv("NEO4J_URI")
 USER = os.getenv("NEO4J_USER")
 PASS = os.getenv("NEO4J_PASS")
 
-driver = GraphDatabase.driver(URI, auth=(USER, PASS))
+_driver = None
+_driver_lock = threading.Lock()
+
+def get_driver():
+    """The Neo4j driver, created on first use (it connects lazily as well)."""
+    global _driver
+    if _driver is None:
+        with _driver_lock:
+            if _driver is None:
+                _driver = GraphDatabase.driver(URI, auth=(USER, PASS))
+    return _driver
+
+def close_driver():
+    global _driver
+    with _driver_lock:
+        if _driver is not None:
+            _driver.close()
+            _driver = None
 
 def create_user(email: str, hashed_pw: str) -> str:
     user_id = str(uuid4())
-    with driver.session() as session:
+    with get_driver().session() as session:
         session.run("""
             MERGE (u:User {email: $email})
             SET u.password = $password, u.user_id = $user_id
@@ -22,7 +43,7 @@ def create_user(email: str, hashed_pw: str) -> str:
     return user_id
 
 def get_user_by_email(email: str):
-    with driver.session() as session:
+    with get_driver().session() as session:
         result = session.run("""
             MATCH (u:User {email: $email})
             RETURN u.user_id AS id, u.password AS password
@@ -32,120 +53,377 @@ def get_user_by_email(email: str):
             return {"user_id": record["id"], "password": record["password"]}
         return None
 
-def create_file_node(repo_id: str, file_path: str):
-    with driver.session() as session:
-        session.run("""
-            MATCH (r:Repo {id: $repo_id})
-            MERGE (f:File {repo_id: $repo_id, path: $path})
-            MERGE (r)-[:HAS_FILE]->(f)
-        """, repo_id=repo_id, path=file_path)
+# Ingest writes only land in a repo that is still 'ingesting'. Each runs in
+# a transaction that starts with this: SET takes the repo's write lock before
+# its status is read, so a delete either commits first (and the write is
+# rejected) or waits for the write to commit and then tombstones it all.
+LOCK_INGESTING_REPO_QUERY = """
+    MATCH (r:Repo {id: $repo_id})
+    SET r.written_at = timestamp()
+    WITH r WHERE r.status = 'ingesting'
+    RETURN count(r) AS ingesting
+"""
 
+def _write_ingesting(repo_id: str, query: str, **params) -> bool:
+    with get_driver().session() as session:
+        with session.begin_transaction() as tx:
+            if not tx.run(LOCK_INGESTING_REPO_QUERY, repo_id=repo_id).single()["ingesting"]:
+                tx.rollback()
+                return False
+            tx.run(query, repo_id=repo_id, **params).consume()
+            tx.commit()
+    return True
 
-def create_dep_relation(repo_id: str, src_path: str, dst_path: str):
-    with driver.session() as session:
-        session.run("""
-            MERGE (a:File {repo_id:$repo_id, path:$src})
-            MERGE (b:File {repo_id:$repo_id, path:$dst})
-            MERGE (a)-[:DEPENDS_ON]->(b)
-        """, repo_id=repo_id, src=src_path, dst=dst_path)
 
+CREATE_FILE_NODE_QUERY = """
+    MATCH (r:Repo {id: $repo_id, status: 'ingesting'})
+    MERGE (f:File {repo_id: $repo_id, path: $path})
+    MERGE (r)-[:HAS_FILE]->(f)
+"""
+
+CREATE_FILE_NODES_QUERY = """
+    MATCH (r:Repo {id: $repo_id, status: 'ingesting'})
+    UNWIND $paths AS path
+    MERGE (f:File {repo_id: $repo_id, path: path})
+    MERGE (r)-[:HAS_FILE]->(f)
+"""
+
+def create_file_node(repo_id: str, file_path: str) -> bool:
+    return _write_ingesting(repo_id, CREATE_FILE_NODE_QUERY, path=file_path)
+
+def create_file_nodes(repo_id: str, paths: list) -> bool:
+    return _write_ingesting(repo_id, CREATE_FILE_NODES_QUERY, paths=list(paths))
+
+
+# Edges only join files the repo already has; a path outside it is skipped
+# rather than MERGEd into a File no repo owns
+CREATE_DEP_RELATION_QUERY = """
+    MATCH (r:Repo {id: $repo_id, status: 'ingesting'})
+    MATCH (r)-[:HAS_FILE]->(a:File {repo_id: $repo_id, path: $src})
+    MATCH (r)-[:HAS_FILE]->(b:File {repo_id: $repo_id, path: $dst})
+    MERGE (a)-[:DEPENDS_ON]->(b)
+"""
+
+CREATE_DEP_RELATIONS_QUERY = """
+    MATCH (r:Repo {id: $repo_id, status: 'ingesting'})
+    UNWIND $edges AS edge
+    MATCH (r)-[:HAS_FILE]->(a:File {repo_id: $repo_id, path: edge[0]})
+    MATCH (r)-[:HAS_FILE]->(b:File {repo_id: $repo_id, path: edge[1]})
+    MERGE (a)-[:DEPENDS_ON]->(b)
+"""
+
+def create_dep_relation(repo_id: str, src_path: str, dst_path: str) -> bool:
+    return _write_ingesting(repo_id, CREATE_DEP_RELATION_QUERY, src=src_path, dst=dst_path)
+
+def create_dep_relations(repo_id: str, edges: list) -> bool:
+    return _write_ingesting(repo_id, CREATE_DEP_RELATIONS_QUERY, edges=[list(e) for e in edges])
 
 
 def get_neighbors(repo_id: str, path: str, depth: int = 1):
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (f:File {repo_id:$repo_id, path:$path})-[:DEPENDS_ON*1..$depth]-(n)
+    # Variable-length bounds cannot be parameters, so depth is inlined
+    with get_driver().session() as session:
+        result = session.run(f"""
+            MATCH (f:File {{repo_id:$repo_id, path:$path}})-[:DEPENDS_ON*1..{int(depth)}]-(n)
             RETURN DISTINCT n.path AS path
-        """, repo_id=repo_id, path=path, depth=depth)
+        """, repo_id=repo_id, path=path)
         return [r["path"] for r in result]
 
+
+GRAPH_CONTEXT_QUERY = """
+    UNWIND $paths AS path
+    MATCH (f:File {repo_id:$repo_id, path:path})
+    OPTIONAL MATCH (f)-[:DEPENDS_ON*1..%d]->(n)
+    RETURN path, collect(DISTINCT n.path) AS neighbors
+"""
+
+def get_dependencies(repo_id: str, paths: list, depth: int = 2):
+    """Outgoing dependencies (1..depth hops) for several files in one round trip."""
+    neighbors = {p: [] for p in paths}
+    with get_driver().session() as session:
+        result = session.run(GRAPH_CONTEXT_QUERY % int(depth), repo_id=repo_id, paths=list(paths))
+        for r in result:
+            neighbors[r["path"]] = r["neighbors"]
+    return neighbors
+
 def run_query(query: str, params: dict = None):
-    with driver.session() as session:
+    with get_driver().session() as session:
         return list(session.run(query, params or {}))
     
-def list_users():
-    with driver.session() as session:
-        result = session.run("MATCH (u:User) RETURN u.user_id AS id, u.email AS email")
+def _users_query(after: str = None, limit: int = None) -> str:
+    # Keyset pagination: the range predicate lets the user_id constraint
+    # serve both the seek and the ORDER BY.
+    where = "u.user_id > $after" if after is not None else "u.user_id IS NOT NULL"
+    query = f"MATCH (u:User) WHERE {where} RETURN u.user_id AS id, u.email AS email ORDER BY u.user_id"
+    if limit is not None:
+        query += " LIMIT $limit"
+    return query
+
+def list_users(limit: int = None, after: str = None):
+    with get_driver().session() as session:
+        result = session.run(_users_query(after, limit), after=after, limit=limit)
         return [{"user_id": r["id"], "email": r["email"]} for r in result]
 
+def iter_users(after: str = None):
+    """Yield users as records arrive from Neo4j instead of building a list."""
+    with get_driver().session() as session:
+        result = session.run(_users_query(after), after=after)
+        for r in result:
+            yield {"user_id": r["id"], "email": r["email"]}
+
 
 def insert_repo(owner, repo, branch="main", user_id=None):
-    """Insert a repo node into Neo4j and link to the owning user."""
+    """
+    Insert a repo node into Neo4j and link to the owning user, if there is one.
+    It starts out "ingesting" until promote_repo makes it the live copy.
+    """
     repo_id = str(uuid4())
     query = """
-        MATCH (u:User {user_id: $user_id})
         CREATE (r:Repo {
             id: $id,
             owner: $owner,
             repo: $repo,
             branch: $branch,
-            user_id: $user_id
+            user_id: $user_id,
+            status: 'ingesting',
+            started_at: timestamp()
         })
-        CREATE (u)-[:OWNS]->(r)
+        WITH r
+        OPTIONAL MATCH (u:User {user_id: $user_id})
+        FOREACH (_ IN CASE WHEN u IS NULL THEN [] ELSE [1] END | CREATE (u)-[:OWNS]->(r))
         RETURN r.id AS id
     """
-    with driver.session() as session:
+    with get_driver().session() as session:
         result = session.run(query, id=repo_id, owner=owner, repo=repo, branch=branch, user_id=user_id)
         return result.single()["id"]
 
 
 
-def insert_chunks(repo_id: str, rows):
-    with driver.session() as session:
-        for row in rows:
-            session.run("""
-                MATCH (r:Repo {id: $repo_id})
-                MATCH (f:File {repo_id: $repo_id, path: $file_path})
-                CREATE (c:Chunk {
-                    id: randomUUID(),
-                    chunk_index: $chunk_index,
-                    content: $content,
-                    embedding: $embedding
-                })
-                CREATE (r)-[:HAS_CHUNK]->(c)
-                CREATE (f)-[:HAS_CHUNK]->(c)
-            """, 
-            repo_id=repo_id,
-            file_path=row["file_path"],
-            chunk_index=row["chunk_index"],
-            content=row["content"],
-            embedding=list(row["embedding"]))
-            
-def get_user_repos(user_id: str):
+# Bodies are shared by content hash. Every row carries content and
+# embedding so a body the GC purged since get_body_vectors is re-created
+INSERT_CHUNKS_QUERY = """
+    MATCH (r:Repo {id: $repo_id, status: 'ingesting'})
+    UNWIND $rows AS row
+    MATCH (r)-[:HAS_FILE]->(f:File {repo_id: $repo_id, path: row.file_path})
+    MERGE (b:ChunkBody {hash: row.hash})
+    ON CREATE SET b.content = row.content, b.embedding = row.embedding, b.refcount = 0
+    ON MATCH SET b.content = coalesce(b.content, row.content),
+                 b.embedding = coalesce(b.embedding, row.embedding)
+    SET b.refcount = b.refcount + 1
+    CREATE (c:Chunk {
+        id: row.id,
+        file_path: row.file_path,
+        chunk_index: row.chunk_index,
+        hash: row.hash
+    })
+    CREATE (r)-[:HAS_CHUNK]->(c)
+    CREATE (f)-[:HAS_CHUNK]->(c)
+    CREATE (c)-[:HAS_BODY]->(b)
+"""
+
+def insert_chunks(repo_id: str, rows) -> bool:
+    rows = [
+        {
+            "id": row["id"],
+            "file_path": row["file_path"],
+            "chunk_index": row["chunk_index"],
+            "hash": row["hash"],
+            "content": row["content"],
+            "embedding": [float(x) for x in row["embedding"]]
+        }
+        for row in rows
+    ]
+    return _write_ingesting(repo_id, INSERT_CHUNKS_QUERY, rows=rows)
+
+
+GET_BODY_VECTORS_QUERY = """
+    UNWIND $hashes AS hash
+    MATCH (b:ChunkBody {hash: hash})
+    RETURN b.hash AS hash, b.embedding AS embedding
+"""
+
+def get_body_vectors(hashes: list):
+    with get_driver().session() as session:
+        return {
+            r["hash"]: np.asarray(r["embedding"], dtype=np.float32)
+            for r in session.run(GET_BODY_VECTORS_QUERY, hashes=list(hashes))
+        }
+
+
+# Scoring phase: ids and vectors only, the chunk text stays in the database.
+# Chunks written before bodies were shared still hold their own embedding.
+# Reads skip tombstoned repos, whose chunks linger until the GC purges them.
+SCAN_VECTORS_QUERY = """
+    MATCH (r:Repo {id: $repo_id})
+    WHERE coalesce(r.status, 'ready') <> 'deleted'
+    MATCH (r)-[:HAS_CHUNK]->(c:Chunk)
+    OPTIONAL MATCH (c)-[:HAS_BODY]->(b:ChunkBody)
+    RETURN c.id AS id, c.file_path AS file_path, coalesce(b.embedding, c.embedding) AS embedding
+"""
+
+# Restricted to some files: seek each File, then walk to its chunks
+SCAN_FILE_CHUNK_VECTORS_QUERY = """
+    MATCH (r:Repo {id: $repo_id})
+    WHERE coalesce(r.status, 'ready') <> 'deleted'
+    UNWIND $paths AS path
+    MATCH (f:File {repo_id: $repo_id, path: path})-[:HAS_CHUNK]->(c:Chunk)
+    OPTIONAL MATCH (c)-[:HAS_BODY]->(b:ChunkBody)
+    RETURN c.id AS id, c.file_path AS file_path, coalesce(b.embedding, c.embedding) AS embedding
+"""
+
+def scan_vectors(repo_id: str, paths: list = None):
+    ids, file_paths, vectors = [], [], []
+    if paths is None:
+        query, params = SCAN_VECTORS_QUERY, {"repo_id": repo_id}
+    else:
+        query, params = SCAN_FILE_CHUNK_VECTORS_QUERY, {"repo_id": repo_id, "paths": list(paths)}
+    with get_driver().session() as session:
+        for r in session.run(query, **params):
+            ids.append(r["id"])
+            file_paths.append(r["file_path"])
+            vectors.append(r["embedding"])
+    matrix = np.array(vectors, dtype=np.float32) if vectors else np.empty((0, 0), dtype=np.float32)
+    return ids, file_paths, matrix
+
+
+SET_FILE_CENTRALITY_QUERY = """
+    MATCH (r:Repo {id: $repo_id, status: 'ingesting'})
+    UNWIND $rows AS row
+    MATCH (r)-[:HAS_FILE]->(f:File {repo_id: $repo_id, path: row.path})
+    SET f.pagerank = row.pagerank, f.in_degree = row.in_degree
+"""
+
+def set_file_centrality(repo_id: str, scores: dict) -> bool:
+    rows = [{"path": path, "pagerank": s["pagerank"], "in_degree": s["in_degree"]} for path, s in scores.items()]
+    return _write_ingesting(repo_id, SET_FILE_CENTRALITY_QUERY, rows=rows)
+
+
+FILE_GRAPH_QUERY = """
+    MATCH (r:Repo {id: $repo_id})-[:HAS_FILE]->(f:File)
+    WHERE coalesce(r.status, 'ready') <> 'deleted'
+    OPTIONAL MATCH (f)-[:DEPENDS_ON]->(n:File)
+    RETURN f.path AS path, coalesce(f.pagerank, 0.0) AS pagerank,
+           coalesce(f.in_degree, 0) AS in_degree, collect(n.path) AS neighbors
+"""
+
+def get_file_graph(repo_id: str):
+    with get_driver().session() as session:
+        return {
+            r["path"]: {"pagerank": r["pagerank"], "in_degree": r["in_degree"], "neighbors": r["neighbors"]}
+            for r in session.run(FILE_GRAPH_QUERY, repo_id=repo_id)
+        }
+
+
+SET_FILE_VECTORS_QUERY = """
+    MATCH (r:Repo {id: $repo_id, status: 'ingesting'})
+    UNWIND $rows AS row
+    MATCH (r)-[:HAS_FILE]->(f:File {repo_id: $repo_id, path: row.path})
+    SET f.centroid = row.centroid
+"""
+
+def set_file_vectors(repo_id: str, vectors: dict) -> bool:
+    rows = [{"path": path, "centroid": [float(x) for x in vec]} for path, vec in vectors.items()]
+    return _write_ingesting(repo_id, SET_FILE_VECTORS_QUERY, rows=rows)
+
+
+SCAN_FILE_VECTORS_QUERY = """
+    MATCH (r:Repo {id: $repo_id})-[:HAS_FILE]->(f:File)
+    WHERE f.centroid IS NOT NULL AND coalesce(r.status, 'ready') <> 'deleted'
+    RETURN f.path AS path, f.centroid AS centroid
+"""
+
+def scan_file_vectors(repo_id: str):
+    paths, vectors = [], []
+    with get_driver().session() as session:
+        for r in session.run(SCAN_FILE_VECTORS_QUERY, repo_id=repo_id):
+            paths.append(r["path"])
+            vectors.append(r["centroid"])
+    matrix = np.array(vectors, dtype=np.float32) if vectors else np.empty((0, 0), dtype=np.float32)
+    return paths, matrix
+
+
+FETCH_CHUNKS_QUERY = """
+    UNWIND $ids AS id
+    MATCH (c:Chunk {id: id})<-[:HAS_CHUNK]-(r:Repo)
+    WHERE coalesce(r.status, 'ready') <> 'deleted'
+    OPTIONAL MATCH (c)-[:HAS_BODY]->(b:ChunkBody)
+    RETURN c.id AS id, c.file_path AS file_path, c.chunk_index AS chunk_index,
+           coalesce(b.content, c.content) AS content
+"""
+
+def fetch_chunks(chunk_ids: list):
+    with get_driver().session() as session:
+        by_id = {
+            r["id"]: {
+                "id": r["id"],
+                "file_path": r["file_path"],
+                "chunk_index": r["chunk_index"],
+                "content": r["content"]
+            }
+            for r in session.run(FETCH_CHUNKS_QUERY, ids=list(chunk_ids))
+        }
+    return [by_id[i] for i in chunk_ids if i in by_id]
+
+GET_USER_REPOS_QUERY = """
+    MATCH (r:Repo {user_id: $user_id})
+    WHERE ($before IS NULL OR r.id < $before) AND coalesce(r.status, 'ready') = 'ready'
+    RETURN r.id AS id, r.owner AS owner, r.repo AS repo, r.branch AS branch
+    ORDER BY r.id DESC
+"""
+
+def _repo_row(record) -> dict:
+    return {
+        "id": record["id"],
+        "owner": record["owner"],
+        "repo": record["repo"],
+        "branch": record["branch"]
+    }
+
+def get_user_repos(user_id: str, limit: int = None, before: str = None):
     """
-    Get all repositories owned by a specific user using user_id property on Repo nodes
+    Get all repositories owned by a specific user using user_id property on Repo nodes.
+    Pass limit/before for keyset pagination (repos are ordered by id, descending).
     """
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (r:Repo)
-            WHERE r.user_id = $user_id
-            RETURN r.id AS id, r.owner AS owner, r.repo AS repo, r.branch AS branch
-            ORDER BY r.id DESC
-        """, user_id=user_id)
+    query = GET_USER_REPOS_QUERY + (" LIMIT $limit" if limit is not None else "")
+    with get_driver().session() as session:
+        result = session.run(query, user_id=user_id, before=before, limit=limit)
+        return [_repo_row(record) for record in result]
 
-        repos = []
+def iter_user_repos(user_id: str, before: str = None):
+    """Yield a user's repos as records arrive from Neo4j."""
+    with get_driver().session() as session:
+        result = session.run(GET_USER_REPOS_QUERY, user_id=user_id, before=before)
         for record in result:
-            repos.append({
-                "id": record["id"],
-                "owner": record["owner"],
-                "repo": record["repo"],
-                "branch": record["branch"]
-            })
+            yield _repo_row(record)
+
+
+COUNT_USER_REPOS_QUERY = """
+    MATCH (r:Repo {user_id: $user_id})
+    WHERE coalesce(r.status, 'ready') = 'ready'
+    RETURN count(r) AS total
+"""
 
-        return repos
+def count_user_repos(user_id: str) -> int:
+    with get_driver().session() as session:
+        return session.run(COUNT_USER_REPOS_QUERY, user_id=user_id).single()["total"]
 
 
+# A UNION of two seeks instead of `WHERE u.email = $x OR u.user_id = $x`,
+# which the planner turns into a full label scan.
+GET_USER_BY_EMAIL_OR_ID_QUERY = """
+    MATCH (u:User {user_id: $identifier})
+    RETURN u.user_id AS user_id, u.email AS email, u.password AS password
+    UNION
+    MATCH (u:User {email: $identifier})
+    RETURN u.user_id AS user_id, u.email AS email, u.password AS password
+"""
+
 def get_user_by_email_or_id(identifier: str):
     """
     Get user by either email or user_id
     """
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (u:User)
-            WHERE u.email = $identifier OR u.user_id = $identifier
-            RETURN u.user_id AS user_id, u.email AS email, u.password AS password
-        """, identifier=identifier)
-        
+    with get_driver().session() as session:
+        result = session.run(GET_USER_BY_EMAIL_OR_ID_QUERY, identifier=identifier)
+
         record = result.single()
         if record:
             return {
@@ -155,20 +433,21 @@ def get_user_by_email_or_id(identifier: str):
             }
         return None
 
+GET_REPO_QUERY = """
+    MATCH (r:Repo {id: $repo_id})
+    WHERE coalesce(r.status, 'ready') <> 'deleted'
+    RETURN r.owner AS owner, r.repo AS repo_name, r.branch AS branch, r.user_id AS user_id,
+           coalesce(r.status, 'ready') AS status
+"""
+
 def get_repo_metadata(repo_id: str):
     """
     Given a repo_id stored in Neo4j, fetch the Repo node,
     extract (owner, repo), and return full metadata from GitHub API.
     """
 
-    with driver.session() as session:
-        result = session.run(
-            """
-            MATCH (r:Repo {id: $repo_id})
-            RETURN r.owner AS owner, r.repo AS repo_name, r.branch AS branch
-            """,
-            repo_id=repo_id
-        ).single()
+    with get_driver().session() as session:
+        result = session.run(GET_REPO_QUERY, repo_id=repo_id).single()
 
     if result is None:
         raise ValueError(f"No repo found with id {repo_id}")
@@ -176,5 +455,248 @@ def get_repo_metadata(repo_id: str):
     return {
         "owner": result["owner"],
         "repo_name": result["repo_name"],
-        "branch": result["branch"]
+        "branch": result["branch"],
+        "user_id": result["user_id"],
+        "status": result["status"]
     }
+
+
+GET_REPO_STATUSES_QUERY = """
+    UNWIND $ids AS id
+    MATCH (r:Repo {id: id})
+    RETURN r.id AS id, coalesce(r.status, 'ready') AS status
+"""
+
+def get_repo_statuses(repo_ids: list):
+    with get_driver().session() as session:
+        return {r["id"]: r["status"] for r in session.run(GET_REPO_STATUSES_QUERY, ids=list(repo_ids))}
+
+
+# Repo lifecycle. A repo is keyed by (user_id, owner, repo, branch): every
+# ingest writes a new "ingesting" Repo and promote_repo swaps it in for the
+# live one. Deleting only tombstones a repo; purge_repo then removes its
+# chunks, files and edges a bounded batch per transaction.
+
+REPO_PREDECESSORS_QUERY = """
+    MATCH (r:Repo {id: $repo_id})
+    MATCH (old:Repo {owner: r.owner, repo: r.repo, branch: r.branch})
+    WHERE old.id <> r.id AND coalesce(old.status, 'ready') = 'ready'
+      AND coalesce(old.user_id, '') = coalesce(r.user_id, '')
+    RETURN collect(old.id) AS ids, coalesce(max(coalesce(old.generation, 0)) + 1, 0) AS generation
+"""
+
+DELETE_REPO_QUERY = """
+    MATCH (r:Repo {id: $repo_id})
+    WHERE coalesce(r.status, 'ready') <> 'deleted'
+    OPTIONAL MATCH (:User)-[o:OWNS]->(r)
+    DELETE o
+    SET r.status = 'deleted'
+    RETURN count(DISTINCT r) AS deleted
+"""
+
+# Tombstones ingests that never finished, in one statement so a promote
+# cannot slip in between. started_at is in milliseconds (timestamp()).
+EXPIRE_INGESTS_QUERY = """
+    MATCH (r:Repo {status: 'ingesting'})
+    WHERE coalesce(r.started_at, 0) < $cutoff
+    OPTIONAL MATCH (:User)-[o:OWNS]->(r)
+    DELETE o
+    SET r.status = 'deleted'
+    RETURN collect(DISTINCT r.id) AS ids
+"""
+
+DELETED_REPOS_QUERY = """
+    MATCH (r:Repo {status: 'deleted'})
+    RETURN r.id AS id
+"""
+
+PURGE_CHUNKS_QUERY = """
+    MATCH (:Repo {id: $repo_id})-[:HAS_CHUNK]->(c:Chunk)
+    WITH c LIMIT $batch_size
+    OPTIONAL MATCH (c)-[:HAS_BODY]->(b:ChunkBody)
+    FOREACH (_ IN CASE WHEN b IS NULL THEN [] ELSE [1] END | SET b.refcount = b.refcount - 1)
+    DETACH DELETE c
+    WITH collect(DISTINCT b) AS bodies, count(*) AS deleted
+    FOREACH (b IN [b IN bodies WHERE b.refcount <= 0] | DETACH DELETE b)
+    RETURN deleted
+"""
+
+# DETACH DELETE also drops the files' DEPENDS_ON edges and any chunks
+# still hanging off them from older ingest paths
+PURGE_FILES_QUERY = """
+    MATCH (f:File)
+    WHERE f.repo_id = $repo_id AND f.path IS NOT NULL
+    WITH f LIMIT $batch_size
+    DETACH DELETE f
+    RETURN count(*) AS deleted
+"""
+
+# Only once nothing hangs off it: a chunk or file that turns up after the
+# batches above keeps the tombstone, and so its GC entry, until the next pass
+PURGE_REPO_QUERY = """
+    MATCH (r:Repo {id: $repo_id, status: 'deleted'})
+    WHERE NOT (r)-[:HAS_CHUNK]->() AND NOT (r)-[:HAS_FILE]->()
+    DETACH DELETE r
+    RETURN count(*) AS deleted
+"""
+
+# Serialises promotes of one (user_id, owner, repo, branch): the second waits
+# on the key node's lock, then finds the first among its predecessors. Owner
+# and repo names cannot hold ':' or '/', and the branch comes last.
+LOCK_REPO_KEY_QUERY = """
+    MATCH (r:Repo {id: $repo_id})
+    MERGE (k:RepoKey {key: coalesce(r.user_id, '') + ':' + r.owner + '/' + r.repo + ':' + r.branch})
+    SET k.locked_at = timestamp()
+"""
+
+PROMOTE_REPO_QUERY = """
+    MATCH (r:Repo {id: $repo_id, status: 'ingesting'})
+    SET r.status = 'ready', r.generation = $generation
+    RETURN count(r) AS promoted
+"""
+
+def promote_repo(repo_id: str):
+    with get_driver().session() as session:
+        with session.begin_transaction() as tx:
+            tx.run(LOCK_REPO_KEY_QUERY, repo_id=repo_id).consume()
+            if not tx.run(LOCK_INGESTING_REPO_QUERY, repo_id=repo_id).single()["ingesting"]:
+                # Deleted while ingesting: leave the tombstone for the GC
+                raise ValueError(f"Repo {repo_id} is not being ingested")
+            previous = tx.run(REPO_PREDECESSORS_QUERY, repo_id=repo_id).single()
+            tx.run(PROMOTE_REPO_QUERY, repo_id=repo_id, generation=previous["generation"]).consume()
+            for old_id in previous["ids"]:
+                tx.run(DELETE_REPO_QUERY, repo_id=old_id).consume()
+            tx.commit()
+    return previous["ids"]
+
+def delete_repo(repo_id: str) -> bool:
+    with get_driver().session() as session:
+        return session.run(DELETE_REPO_QUERY, repo_id=repo_id).single()["deleted"] > 0
+
+def expire_ingests(max_age_seconds: float):
+    cutoff = int((time.time() - max_age_seconds) * 1000)
+    with get_driver().session() as session:
+        return session.run(EXPIRE_INGESTS_QUERY, cutoff=cutoff).single()["ids"]
+
+# SET first takes the node's write lock, so the holder and expiry read next
+# are what the last lease holder committed
+ACQUIRE_LEASE_QUERY = """
+    MERGE (l:Lease {name: $name})
+    SET l.claimed_at = $now
+    WITH l, coalesce(l.holder, $holder) = $holder OR coalesce(l.expires, 0) < $now AS free
+    FOREACH (_ IN CASE WHEN free THEN [1] ELSE [] END | SET l.holder = $holder, l.expires = $now + $ttl)
+    RETURN free
+"""
+
+def acquire_lease(name: str, holder: str, ttl_seconds: float) -> bool:
+    with get_driver().session() as session:
+        return session.run(ACQUIRE_LEASE_QUERY, name=name, holder=holder,
+                           now=int(time.time() * 1000), ttl=int(ttl_seconds * 1000)).single()["free"]
+
+def list_deleted_repos():
+    with get_driver().session() as session:
+        return [r["id"] for r in session.run(DELETED_REPOS_QUERY)]
+
+def purge_repo(repo_id: str, batch_size: int = 1000) -> int:
+    with get_driver().session() as session:
+        for query in (PURGE_CHUNKS_QUERY, PURGE_FILES_QUERY):
+            deleted = session.run(query, repo_id=repo_id, batch_size=batch_size).single()["deleted"]
+            if deleted:
+                return deleted
+        return session.run(PURGE_REPO_QUERY, repo_id=repo_id).single()["deleted"]
+
+
+
+class Neo4jStore(GraphStore):
+    """GraphStore backed by the module-level Neo4j driver."""
+
+    def setup(self):
+        from schema import ensure_schema
+        ensure_schema()
+
+    def close(self):
+        close_driver()
+
+    def create_user(self, email, hashed_pw):
+        return create_user(email, hashed_pw)
+
+    def get_user_by_email(self, email):
+        return get_user_by_email(email)
+
+    def get_user_by_email_or_id(self, identifier):
+        return get_user_by_email_or_id(identifier)
+
+    def list_users(self, limit=None, after=None):
+        return list_users(limit, after)
+
+    def iter_users(self, after=None):
+        return iter_users(after)
+
+    def insert_repo(self, owner, repo, branch="main", user_id=None):
+        return insert_repo(owner, repo, branch, user_id)
+
+    def get_repo_metadata(self, repo_id):
+        return get_repo_metadata(repo_id)
+
+    def get_repo_statuses(self, repo_ids):
+        return get_repo_statuses(repo_ids)
+
+    def promote_repo(self, repo_id):
+        return promote_repo(repo_id)
+
+    def delete_repo(self, repo_id):
+        return delete_repo(repo_id)
+
+    def expire_ingests(self, max_age_seconds):
+        return expire_ingests(max_age_seconds)
+
+    def acquire_lease(self, name, holder, ttl_seconds):
+        return acquire_lease(name, holder, ttl_seconds)
+
+    def list_deleted_repos(self):
+        return list_deleted_repos()
+
+    def purge_repo(self, repo_id, batch_size=1000):
+        return purge_repo(repo_id, batch_size)
+
+    def get_user_repos(self, user_id, limit=None, before=None):
+        return get_user_repos(user_id, limit, before)
+
+    def iter_user_repos(self, user_id, before=None):
+        return iter_user_repos(user_id, before)
+
+    def count_user_repos(self, user_id):
+        return count_user_repos(user_id)
+
+    def create_file_nodes(self, repo_id, paths):
+        return create_file_nodes(repo_id, paths)
+
+    def create_dep_relations(self, repo_id, edges):
+        return create_dep_relations(repo_id, edges)
+
+    def get_dependencies(self, repo_id, paths, depth=2):
+        return get_dependencies(repo_id, paths, depth)
+
+    def insert_chunks(self, repo_id, rows):
+        return insert_chunks(repo_id, rows)
+
+    def get_body_vectors(self, hashes):
+        return get_body_vectors(hashes)
+
+    def scan_vectors(self, repo_id, paths=None):
+        return scan_vectors(repo_id, paths)
+
+    def set_file_centrality(self, repo_id, scores):
+        return set_file_centrality(repo_id, scores)
+
+    def get_file_graph(self, repo_id):
+        return get_file_graph(repo_id)
+
+    def set_file_vectors(self, repo_id, vectors):
+        return set_file_vectors(repo_id, vectors)
+
+    def scan_file_vectors(self, repo_id):
+        return scan_file_vectors(repo_id)
+
+    def fetch_chunks(self, chunk_ids):
+        return fetch_chunks(chunk_ids)
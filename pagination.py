@@ -0,0 +1,46 @@
+# pagination.py
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(key: str) -> str:
+    """Wrap the last seen sort key into an opaque, URL-safe cursor."""
+    raw = json.dumps({"k": key}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """
+    Inverse of encode_cursor. Returns None for an empty cursor.
+    Raises ValueError if the cursor was not produced by encode_cursor.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded))["k"]
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def paginate(rows: list, limit: int, key: str = None):
+    """
+    rows must have been fetched with limit + 1 so we can tell whether
+    another page exists without a separate COUNT. key names the sort
+    field of each row; rows are used as-is when it is None.
+    Returns (page, next_cursor).
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    last = page[-1][key] if key else page[-1]
+    return page, encode_cursor(last)
+
+
+def ndjson(rows):
+    """Serialize an iterable of dicts as newline-delimited JSON, one row at a time."""
+    for row in rows:
+        yield json.dumps(row) + "\n"
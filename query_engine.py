@@ -1,100 +1,325 @@
 # query_engine.py
 import os
-from supabase_client import supabase
-import openai
-from neo4j_client import driver
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from graph_store import get_store
 from dotenv import load_dotenv
 import numpy as np
-from embedder import client, EMBED_MODEL
+from cachetools import TTLCache
+from embedder import get_client, EMBED_MODEL
+from metrics import stage, TOKENS_TOTAL, CACHE_REQUESTS
+from rerank import mmr
+from shared_index import get_index
 
 load_dotenv()
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
 CHAT_MODEL = "gpt-4.1"
 
+# MMR trade-off: 1.0 ranks purely by relevance, 0.0 purely by diversity
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+# Leading embedding dimensions MMR compares candidates on; 0 uses all of them
+MMR_DIMS = int(os.getenv("MMR_DIMS", "256")) or None
+# Optional cap on chunks taken from any one file
+MAX_CHUNKS_PER_FILE = int(os.getenv("MAX_CHUNKS_PER_FILE", "0")) or None
+# "flat" scores every chunk; "hierarchical" scores file centroids first and
+# only scans the chunks of the TOP_FILES best files
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "flat").lower()
+TOP_FILES = int(os.getenv("TOP_FILES", "20"))
+# Weight of the file's PageRank (scaled to 0..1 within the repo) added to its
+# chunks' scores; off by default, 0.05 is a sensible starting point
+CENTRALITY_WEIGHT = float(os.getenv("CENTRALITY_WEIGHT", "0"))
+# Extra chunks taken from direct dependencies of the selected files, best
+# match first, sent on top of top_k; off by default
+NEIGHBOR_CHUNKS = int(os.getenv("NEIGHBOR_CHUNKS", "0"))
+
+# Repos scored concurrently by a cross-repo query; each holds one repo's vectors
+CROSS_REPO_WORKERS = int(os.getenv("CROSS_REPO_WORKERS", "8"))
+# Default cap on concurrent chat completions for one /query/batch request
+BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", "4"))
+
+# Centrality and edges only change at ingest: 5 min TTL. Holds a full
+# cross-repo scope (up to 200 repos) so one query doesn't evict its own entries
+FILE_GRAPH_CACHE_SIZE = int(os.getenv("FILE_GRAPH_CACHE_SIZE", "256"))
+file_graph_cache = TTLCache(maxsize=FILE_GRAPH_CACHE_SIZE, ttl=300)
+file_graph_lock = threading.Lock()
+
 def embed_query(text: str):
-    resp = client.embeddings.create(model=EMBED_MODEL, input=text)
+    with stage("embed"):
+        resp = get_client().embeddings.create(model=EMBED_MODEL, input=text)
+    TOKENS_TOTAL.inc(resp.usage.total_tokens, "embedding")
     return resp.data[0].embedding
 
+def embed_queries(texts: list):
+    """Embeds several questions in one API call, in order."""
+    with stage("embed"):
+        resp = get_client().embeddings.create(model=EMBED_MODEL, input=texts)
+    TOKENS_TOTAL.inc(resp.usage.total_tokens, "embedding")
+    return [item.embedding for item in sorted(resp.data, key=lambda d: d.index)]
+
 # For chat completion
 def ask_chat(prompt: str):
-    resp = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=800
-    )
+    with stage("llm"):
+        resp = get_client().chat.completions.create(
+            model="gpt-4o",
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=800
+        )
+    if resp.usage:
+        TOKENS_TOTAL.inc(resp.usage.prompt_tokens, "prompt")
+        TOKENS_TOTAL.inc(resp.usage.completion_tokens, "completion")
     return resp.choices[0].message.content
 
-def search_chunks(repo_id: str, query: str, k=5, fetch_multiplier=3):
+def search_chunks(repo_id: str, query: str, k=5, fetch_multiplier=3, mode=None, top_files=None):
     q_emb = embed_query(query)
-    
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (r:Repo {id: $repo_id})-[:HAS_CHUNK]->(c:Chunk)
-            RETURN c.file_path AS file_path, c.chunk_index AS chunk_index,
-                   c.content AS content, c.embedding AS embedding
-        """, repo_id=repo_id)
-
-        chunks = []
-        for r in result:
-            emb = np.array(r["embedding"], dtype=float)
-            chunks.append({
-                "file_path": r["file_path"],
-                "chunk_index": r["chunk_index"],
-                "content": r["content"],
-                "embedding": emb
-            })
-
-    q_vec = np.array(q_emb)
-    for c in chunks:
-        c["score"] = np.dot(q_vec, c["embedding"]) / (
-            np.linalg.norm(q_vec) * np.linalg.norm(c["embedding"])
-        )
+    with stage("retrieval"):
+        return rank_chunks(repo_id, q_emb, k, fetch_multiplier, mode=mode, top_files=top_files)
+
+def row_norms(matrix: np.ndarray) -> np.ndarray:
+    return np.sqrt(np.einsum("ij,ij->i", matrix, matrix))
+
+def cosine_scores(matrix: np.ndarray, q_emb, norms: np.ndarray = None) -> np.ndarray:
+    q_vec = np.asarray(q_emb, dtype=np.float32)
+    if norms is None:
+        norms = row_norms(matrix)
+    denom = norms * np.linalg.norm(q_vec)
+    return (matrix @ q_vec) / np.where(denom == 0, 1, denom)
+
+def cosine_matrix(matrix: np.ndarray, queries, norms: np.ndarray = None) -> np.ndarray:
+    """Scores of every row against every query in one matrix-matrix product; shape (rows, queries)."""
+    q_mat = np.asarray(queries, dtype=np.float32)
+    if norms is None:
+        norms = row_norms(matrix)
+    denom = np.outer(norms, row_norms(q_mat))
+    return (matrix @ q_mat.T) / np.where(denom == 0, 1, denom)
+
+def top_indices(scores: np.ndarray, n: int) -> np.ndarray:
+    """Indices of the n highest scores, best first, without sorting everything."""
+    n = min(n, len(scores))
+    if n == 0:
+        return np.empty(0, dtype=int)
+    top = np.argpartition(-scores, n - 1)[:n]
+    return top[np.argsort(-scores[top])]
+
+def file_graph(repo_id: str) -> dict:
+    """Cached get_file_graph, with each file's PageRank scaled to a 0..1 "prior"."""
+    with file_graph_lock:
+        graph = file_graph_cache.get(repo_id)
+    if graph is not None:
+        CACHE_REQUESTS.inc(1, "file_graph", "hit")
+        return graph
+    CACHE_REQUESTS.inc(1, "file_graph", "miss")
+    graph = get_store().get_file_graph(repo_id)
+    top = max((f["pagerank"] for f in graph.values()), default=0) or 1
+    for f in graph.values():
+        f["prior"] = f["pagerank"] / top
+    with file_graph_lock:
+        file_graph_cache[repo_id] = graph
+    return graph
+
+def scan_vectors(repo_id: str, paths: list = None):
+    # Served from the host-wide memory-mapped copy when SHARED_INDEX_DIR is set
+    index = get_index()
+    if index is not None:
+        return index.scan_vectors(repo_id, paths)
+    return get_store().scan_vectors(repo_id, paths)
+
+def best_files(repo_id: str, queries, top_files=None, graph=None):
+    """
+    Per query, the files whose centroids match it best, plus their direct
+    dependencies when a graph is given. None for repos ingested before
+    file vectors existed.
+    """
+    paths, file_matrix = get_store().scan_file_vectors(repo_id)
+    if not paths:
+        return None
+    scores = cosine_matrix(file_matrix, queries)
+    result = []
+    for j in range(scores.shape[1]):
+        best = [paths[i] for i in top_indices(scores[:, j], top_files or TOP_FILES)]
+        if graph:
+            best += [n for p in best for n in graph.get(p, {}).get("neighbors", ())]
+        result.append(list(dict.fromkeys(best)))
+    return result
+
+def candidate_vectors(repo_id: str, q_emb, mode=None, top_files=None, graph=None):
+    """
+    Chunk ids, paths and vectors to score. Hierarchical mode narrows the
+    scan to best_files and falls back to the flat scan without file vectors.
+    """
+    if (mode or RETRIEVAL_MODE) == "hierarchical":
+        best = best_files(repo_id, [q_emb], top_files, graph)
+        if best:
+            return scan_vectors(repo_id, best[0])
+    return scan_vectors(repo_id)
+
+def neighbor_rows(graph: dict, file_paths: list, scores: np.ndarray, selected: list, limit: int) -> list:
+    """Best-scoring chunk of each direct dependency of the selected files, up to limit rows."""
+    chosen = {file_paths[i] for i in selected}
+    wanted = {n for p in chosen for n in graph.get(p, {}).get("neighbors", ())} - chosen
+    if not wanted or limit <= 0:
+        return []
+    rows = np.fromiter((i for i, p in enumerate(file_paths) if p in wanted), dtype=np.int64)
+    picked, seen = [], set()
+    for i in rows[np.argsort(-scores[rows])]:
+        if file_paths[i] not in seen:
+            seen.add(file_paths[i])
+            picked.append(int(i))
+            if len(picked) == limit:
+                break
+    return picked
+
+def select_chunks(repo_id: str, q_emb, k=5, fetch_multiplier=3,
+                  lambda_mult=MMR_LAMBDA, max_per_file=MAX_CHUNKS_PER_FILE, mode=None, top_files=None,
+                  centrality_weight=CENTRALITY_WEIGHT, neighbor_chunks=NEIGHBOR_CHUNKS):
+    """
+    Phase 1 for one repo: scores ids and vectors only. Returns
+    (picks, neighbors), each a list of (chunk id, score), best first.
+    """
+    graph = file_graph(repo_id) if centrality_weight or neighbor_chunks else {}
+    ids, file_paths, matrix = candidate_vectors(repo_id, q_emb, mode, top_files, graph)
+    if not ids:
+        return [], []
+    norms = row_norms(matrix)
+    scores = cosine_scores(matrix, q_emb, norms)
+    return pick_chunks(ids, file_paths, matrix, norms, scores, graph, k, fetch_multiplier,
+                       lambda_mult, max_per_file, centrality_weight, neighbor_chunks)
+
+def select_chunks_batch(repo_id: str, q_embs: list, k=5, fetch_multiplier=3,
+                        lambda_mult=MMR_LAMBDA, max_per_file=MAX_CHUNKS_PER_FILE, mode=None, top_files=None,
+                        centrality_weight=CENTRALITY_WEIGHT, neighbor_chunks=NEIGHBOR_CHUNKS):
+    """
+    select_chunks for several questions about one repo: one graph lookup
+    and one vector scan, scored as a single matrix-matrix product.
+    Returns one (picks, neighbors) pair per question.
+    """
+    graph = file_graph(repo_id) if centrality_weight or neighbor_chunks else {}
+    queries = np.asarray(q_embs, dtype=np.float32)
+    best = best_files(repo_id, queries, top_files, graph) if (mode or RETRIEVAL_MODE) == "hierarchical" else None
+    if best:
+        ids, file_paths, matrix = scan_vectors(repo_id, list(dict.fromkeys(p for paths in best for p in paths)))
+    else:
+        ids, file_paths, matrix = scan_vectors(repo_id)
+    if not ids:
+        return [([], [])] * len(queries)
+    norms = row_norms(matrix)
+    scores = cosine_matrix(matrix, queries, norms)
+
+    results = []
+    for j in range(len(queries)):
+        if not best:
+            results.append(pick_chunks(ids, file_paths, matrix, norms, scores[:, j], graph, k, fetch_multiplier,
+                                       lambda_mult, max_per_file, centrality_weight, neighbor_chunks))
+            continue
+        # Each question only sees the chunks of its own best files
+        wanted = set(best[j])
+        rows = np.fromiter((i for i, p in enumerate(file_paths) if p in wanted), dtype=np.int64)
+        results.append(pick_chunks([ids[i] for i in rows], [file_paths[i] for i in rows], matrix[rows], norms[rows],
+                                   scores[rows, j], graph, k, fetch_multiplier,
+                                   lambda_mult, max_per_file, centrality_weight, neighbor_chunks))
+    return results
 
-    # Fetch more initially, then diversify
-    top_chunks = sorted(chunks, key=lambda x: x["score"], reverse=True)[: k * fetch_multiplier]
-    
-    # Diversify: ensure we get chunks from different files
-    selected = []
-    seen_files = set()
-    
-    for chunk in top_chunks:
-        if len(selected) >= k:
-            break
-        if chunk["file_path"] not in seen_files:
-            selected.append(chunk)
-            seen_files.add(chunk["file_path"])
-    
-    # Fill remaining slots if needed
-    for chunk in top_chunks:
-        if len(selected) >= k:
-            break
-        if chunk not in selected:
-            selected.append(chunk)
-    
-    return selected[:k]
+def pick_chunks(ids, file_paths, matrix, norms, scores, graph, k, fetch_multiplier,
+                lambda_mult, max_per_file, centrality_weight, neighbor_chunks):
+    """Shortlist, centrality prior, MMR and neighbour chunks over one question's scores."""
+    if not ids:
+        return [], []
+    # Fetch more initially, then diversify with MMR
+    pool = k * fetch_multiplier
+    if centrality_weight and graph:
+        # The prior only reorders a wider shortlist of relevant chunks,
+        # so a central but unrelated file cannot crowd out real matches
+        shortlist = top_indices(scores, 4 * pool)
+        blended = scores[shortlist] + centrality_weight * np.array(
+            [graph.get(file_paths[i], {}).get("prior", 0.0) for i in shortlist], dtype=np.float32)
+        order = top_indices(blended, pool)
+        top, relevance = shortlist[order], blended[order]
+    else:
+        top = top_indices(scores, pool)
+        relevance = scores[top]
+    picks = mmr(matrix[top], relevance, k, lambda_mult,
+                groups=[file_paths[i] for i in top], max_per_group=max_per_file, norms=norms[top], dims=MMR_DIMS)
+    selected = [top[p] for p in picks]
+    picked = sorted(((ids[top[p]], float(relevance[p])) for p in picks), key=lambda t: -t[1])
+    chosen = {cid for cid, _ in picked}
+    neighbors = neighbor_rows(graph, file_paths, scores, selected, neighbor_chunks) if graph else []
+    return picked, [(ids[i], float(scores[i])) for i in neighbors if ids[i] not in chosen]
+
+def fetch_scored(picks: list, neighbors: list = ()) -> list:
+    """Phase 2: one batched lookup for the winners' and neighbours' content."""
+    return fetch_scored_batch([(picks, neighbors)])[0]
+
+def fetch_scored_batch(selections: list) -> list:
+    """
+    fetch_scored for several (picks, neighbors) pairs in one lookup. A chunk
+    picked by more than one question is copied, each with its own score.
+    """
+    wanted = dict.fromkeys(cid for picks, neighbors in selections for cid, _ in itertools.chain(picks, neighbors))
+    by_id = {c["id"]: c for c in get_store().fetch_chunks(list(wanted))}
+    result = []
+    for picks, neighbors in selections:
+        chunks = [dict(by_id[cid], score=score) for cid, score in picks if cid in by_id]
+        chunks += [dict(by_id[cid], score=score, neighbor=True) for cid, score in neighbors if cid in by_id]
+        result.append(chunks)
+    return result
+
+def rank_chunks(repo_id: str, q_emb, k=5, fetch_multiplier=3, **options):
+    picks, neighbors = select_chunks(repo_id, q_emb, k, fetch_multiplier, **options)
+    return fetch_scored(picks, neighbors)
+
+def rank_across_repos(repo_ids: list, q_emb, k=5, fetch_multiplier=3,
+                      neighbor_chunks=NEIGHBOR_CHUNKS, **options):
+    """
+    Merged top-k over several repos. Each repo is scored on its own worker
+    and keeps only its k best picks, so at most CROSS_REPO_WORKERS repos'
+    vectors are in memory at once; the sorted per-repo lists are then
+    k-way merged and fetched in one batch. Chunks carry their repo_id.
+    """
+    def one(repo_id):
+        picks, neighbors = select_chunks(repo_id, q_emb, k, fetch_multiplier,
+                                         neighbor_chunks=neighbor_chunks, **options)
+        return [(score, cid, repo_id) for cid, score in picks], [(score, cid, repo_id) for cid, score in neighbors]
+
+    if not repo_ids:
+        return []
+    with ThreadPoolExecutor(max_workers=min(CROSS_REPO_WORKERS, len(repo_ids))) as pool:
+        results = list(pool.map(one, repo_ids))
+
+    by_score = lambda t: -t[0]
+    winners = list(itertools.islice(heapq.merge(*(picks for picks, _ in results), key=by_score), k))
+    # Neighbours only from repos that contributed a winner
+    winning_repos = {repo_id for _, _, repo_id in winners}
+    neighbors = list(itertools.islice(heapq.merge(
+        *(n for picks, n in results if picks and picks[0][2] in winning_repos), key=by_score), neighbor_chunks))
+
+    repo_by_chunk = {cid: repo_id for _, cid, repo_id in winners + neighbors}
+    chunks = fetch_scored([(cid, score) for score, cid, _ in winners], [(cid, score) for score, cid, _ in neighbors])
+    for c in chunks:
+        c["repo_id"] = repo_by_chunk[c["id"]]
+    return chunks
 
 def get_graph_context(repo_id: str, paths: list):
     # find neighbors for each top chunk file_path
-    neighbors = {}
-    with driver.session() as session:
-        for p in paths:
-            result = session.run("""
-                MATCH (f:File {repo_id:$repo_id, path:$path})-[:DEPENDS_ON*1..2]->(n)
-                RETURN DISTINCT n.path AS path
-            """, repo_id=repo_id, path=p)
-            neighbors[p] = [r["path"] for r in result]
-    return neighbors
-
-def answer_question(repo_id: str, question: str, top_k=8):
-    chunks = search_chunks(repo_id, question, top_k)
-    top_paths = list({c["file_path"] for c in chunks})
-    graph_ctx = get_graph_context(repo_id, top_paths)
+    with stage("graph_context"):
+        return get_store().get_dependencies(repo_id, paths, depth=2)
 
-    context_text = "\n\n".join([f"FILE: {c['file_path']}\n\n{c['content']}" for c in chunks])
+def source(c: dict) -> dict:
+    """What a response cites for a chunk; neighbour chunks are dependency context, not ranked matches."""
+    cited = {k: c[k] for k in ("repo_id", "file_path", "chunk_index", "score") if k in c}
+    cited["neighbor"] = c.get("neighbor", False)
+    return cited
 
-    prompt = f"""You are an expert code analyst. Analyze the provided code snippets and file dependencies to answer the question.
+def format_chunk(c: dict) -> str:
+    label = f"REPO: {c['repo_id']} FILE: {c['file_path']}" if "repo_id" in c else f"FILE: {c['file_path']}"
+    if c.get("neighbor"):
+        label += " (dependency of a matched file)"
+    return f"{label}\n\n{c['content']}"
+
+def build_prompt(question: str, chunks: list, graph_ctx) -> str:
+    context_text = "\n\n".join(format_chunk(c) for c in chunks)
+
+    return f"""You are an expert code analyst. Analyze the provided code snippets and file dependencies to answer the question.
 
 IMPORTANT INSTRUCTIONS:
 - Be specific and cite actual code, file names, and technical details
@@ -112,6 +337,59 @@ FILE DEPENDENCIES:
 QUESTION: {question}
 
 Provide a detailed, technical answer based on the code provided:"""
-    
-    resp = ask_chat(prompt)
-    return resp
+
+def answer_question(repo_id: str, question: str, top_k=8, mode=None, top_files=None):
+    chunks = search_chunks(repo_id, question, top_k, mode=mode, top_files=top_files)
+    top_paths = list({c["file_path"] for c in chunks})
+    graph_ctx = get_graph_context(repo_id, top_paths)
+    return ask_chat(build_prompt(question, chunks, graph_ctx))
+
+def answer_questions(repo_id: str, questions: list, top_k=8, mode=None, top_files=None, max_parallel=None):
+    """
+    Answers several questions about one repo. Embedding, retrieval, the
+    content fetch and the graph context are done once for the whole batch,
+    before this returns; the chat completions then run up to max_parallel
+    at a time. Returns an iterator of {"index", "answer", "sources"} (or
+    {"index", "error"}) in completion order.
+    """
+    q_embs = embed_queries(questions)
+    with stage("retrieval"):
+        selections = select_chunks_batch(repo_id, q_embs, top_k, mode=mode, top_files=top_files)
+        chunks_per_question = fetch_scored_batch(selections)
+    all_paths = list(dict.fromkeys(c["file_path"] for chunks in chunks_per_question for c in chunks))
+    graph_ctx = get_graph_context(repo_id, all_paths)
+
+    prompts = []
+    for question, chunks in zip(questions, chunks_per_question):
+        paths = dict.fromkeys(c["file_path"] for c in chunks)
+        prompts.append(build_prompt(question, chunks, {p: graph_ctx.get(p, []) for p in paths}))
+    return complete_prompts(prompts, chunks_per_question, max_parallel or BATCH_MAX_PARALLEL)
+
+def complete_prompts(prompts: list, chunks_per_question: list, max_parallel: int):
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(prompts))))
+    futures = {pool.submit(ask_chat, prompt): i for i, prompt in enumerate(prompts)}
+    try:
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                answer = future.result()
+            except Exception as e:
+                # One failed completion should not cost the rest of the batch
+                yield {"index": i, "error": str(e)}
+                continue
+            sources = [source(c) for c in chunks_per_question[i]]
+            yield {"index": i, "answer": answer, "sources": sources}
+    finally:
+        # Client went away: drop the completions that have not started
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def answer_question_across(repo_ids: list, question: str, top_k=8, mode=None, top_files=None):
+    """Answer from the merged top-k of several repos. Returns (answer, chunks)."""
+    q_emb = embed_query(question)
+    with stage("retrieval"):
+        chunks = rank_across_repos(repo_ids, q_emb, top_k, mode=mode, top_files=top_files)
+    paths_by_repo = {}
+    for c in chunks:
+        paths_by_repo.setdefault(c["repo_id"], set()).add(c["file_path"])
+    graph_ctx = {repo_id: get_graph_context(repo_id, list(paths)) for repo_id, paths in paths_by_repo.items()}
+    return ask_chat(build_prompt(question, chunks, graph_ctx)), chunks
@@ -0,0 +1,80 @@
+# rerank.py
+"""
+Maximal Marginal Relevance over a candidate matrix.
+
+Each step picks the candidate maximising
+
+    lambda_mult * relevance - (1 - lambda_mult) * max similarity to anything already picked
+
+Similarities are computed one picked row at a time (one n x d
+mat-vec per step), so the cost is O(k * n * d) with no n x n matrix.
+Only the diversity term needs them, and text-embedding-3 vectors keep
+most of their geometry in the leading dimensions, so they are taken
+over the first `dims` dimensions, re-normalised (256 of 3072 by
+default). Relevance is passed in and stays full-precision.
+"""
+from typing import List, Optional, Sequence
+import numpy as np
+
+
+def mmr(
+    candidates: np.ndarray,
+    relevance: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.7,
+    groups: Optional[Sequence] = None,
+    max_per_group: Optional[int] = None,
+    norms: Optional[np.ndarray] = None,
+    dims: Optional[int] = 256,
+) -> List[int]:
+    """
+    candidates: (n, d) embeddings; relevance: (n,) query scores.
+    norms: row norms of candidates, if the caller already has them
+    (ignored when the vectors are truncated). dims=None uses every dimension.
+    groups/max_per_group optionally cap how many picks share a group
+    (e.g. a file path). Returns indices into candidates, in pick order.
+    lambda_mult=1 is pure relevance, 0 is pure diversity.
+    """
+    n = len(candidates)
+    k = min(k, n)
+    if k <= 0:
+        return []
+
+    vectors = np.asarray(candidates, dtype=np.float32)
+    if dims is not None and vectors.shape[1] > dims:
+        vectors = np.ascontiguousarray(vectors[:, :dims])
+        norms = None
+    if norms is None:
+        norms = np.sqrt(np.einsum("ij,ij->i", vectors, vectors))
+    norms = np.asarray(norms, dtype=np.float32)
+    unit = vectors / np.where(norms == 0, 1, norms)[:, None]
+    relevance = np.asarray(relevance, dtype=np.float32)
+
+    # Picked and capped-out candidates get a base score of -inf
+    base = lambda_mult * relevance
+    max_sim = np.zeros(n, dtype=np.float32)
+    scores = np.empty(n, dtype=np.float32)
+    diversity = 1.0 - lambda_mult
+
+    codes = counts = None
+    if groups is not None and max_per_group is not None:
+        _, codes = np.unique(np.asarray(groups, dtype=object).astype(str), return_inverse=True)
+        counts = np.zeros(codes.max() + 1, dtype=int)
+
+    selected = []
+    for step in range(k):
+        np.multiply(max_sim, diversity, out=scores)
+        np.subtract(base, scores, out=scores)
+        best = int(np.argmax(scores))
+        if scores[best] == -np.inf:
+            break
+        selected.append(best)
+        base[best] = -np.inf
+        if codes is not None:
+            group = codes[best]
+            counts[group] += 1
+            if counts[group] >= max_per_group:
+                base[codes == group] = -np.inf
+        if step < k - 1:
+            np.maximum(max_sim, unit @ unit[best], out=max_sim)
+    return selected
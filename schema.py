@@ -0,0 +1,83 @@
+# schema.py
+"""
+Idempotent Neo4j schema bootstrap.
+
+Every statement uses IF NOT EXISTS, so it is safe to run on every startup.
+Backfills are versioned migrations: each runs once per database, and
+startup only reads the version from a single (:SchemaVersion) node.
+"""
+from neo4j_client import get_driver
+
+CONSTRAINTS = [
+    "CREATE CONSTRAINT user_email_unique IF NOT EXISTS FOR (u:User) REQUIRE u.email IS UNIQUE",
+    "CREATE CONSTRAINT user_id_unique IF NOT EXISTS FOR (u:User) REQUIRE u.user_id IS UNIQUE",
+    "CREATE CONSTRAINT repo_id_unique IF NOT EXISTS FOR (r:Repo) REQUIRE r.id IS UNIQUE",
+    "CREATE CONSTRAINT chunk_id_unique IF NOT EXISTS FOR (c:Chunk) REQUIRE c.id IS UNIQUE",
+    "CREATE CONSTRAINT chunk_body_hash_unique IF NOT EXISTS FOR (b:ChunkBody) REQUIRE b.hash IS UNIQUE",
+    "CREATE CONSTRAINT lease_name_unique IF NOT EXISTS FOR (l:Lease) REQUIRE l.name IS UNIQUE",
+    "CREATE CONSTRAINT repo_key_unique IF NOT EXISTS FOR (k:RepoKey) REQUIRE k.key IS UNIQUE",
+    "CREATE CONSTRAINT schema_version_name_unique IF NOT EXISTS FOR (v:SchemaVersion) REQUIRE v.name IS UNIQUE",
+]
+
+INDEXES = [
+    "CREATE INDEX file_repo_path IF NOT EXISTS FOR (f:File) ON (f.repo_id, f.path)",
+    "CREATE INDEX repo_user_id IF NOT EXISTS FOR (r:Repo) ON (r.user_id)",
+    "CREATE INDEX repo_key IF NOT EXISTS FOR (r:Repo) ON (r.owner, r.repo, r.branch)",
+    "CREATE INDEX repo_status IF NOT EXISTS FOR (r:Repo) ON (r.status)",
+]
+
+
+# Data fixes, applied in order and only once: the number applied so far is
+# the SchemaVersion's version, so append new ones and never reorder. Each
+# statement processes one batch and reports how many nodes it touched, and
+# is repeated until that is 0 (they are also safe to re-run).
+BACKFILLS = [
+    # Chunks written by the old ingest path had no id
+    """
+    MATCH (c:Chunk) WHERE c.id IS NULL
+    WITH c LIMIT 10000
+    SET c.id = randomUUID()
+    RETURN count(c) AS updated
+    """,
+    # ... and chunks from the neo4j_client path had no file_path
+    """
+    MATCH (f:File)-[:HAS_CHUNK]->(c:Chunk) WHERE c.file_path IS NULL
+    WITH f, c LIMIT 10000
+    SET c.file_path = f.path
+    RETURN count(c) AS updated
+    """,
+]
+
+
+SCHEMA_VERSION_QUERY = """
+MERGE (v:SchemaVersion {name: 'graph'})
+ON CREATE SET v.version = 0
+RETURN v.version AS version
+"""
+
+SET_SCHEMA_VERSION_QUERY = "MATCH (v:SchemaVersion {name: 'graph'}) SET v.version = $version"
+
+
+def run_backfills(session) -> int:
+    """Apply the backfills this database has not seen yet. Returns how many ran."""
+    applied = session.run(SCHEMA_VERSION_QUERY).single()["version"]
+    for version in range(applied, len(BACKFILLS)):
+        print(f"⏳ Running backfill {version + 1}/{len(BACKFILLS)}")
+        while session.run(BACKFILLS[version]).single()["updated"]:
+            pass
+        session.run(SET_SCHEMA_VERSION_QUERY, version=version + 1).consume()
+    return max(len(BACKFILLS) - applied, 0)
+
+
+def ensure_schema():
+    """Create all constraints and indexes, wait for them to come online, then run pending backfills."""
+    with get_driver().session() as session:
+        for statement in CONSTRAINTS + INDEXES:
+            session.run(statement).consume()
+        session.run("CALL db.awaitIndexes(300)").consume()
+        run_backfills(session)
+    print(f"✓ Schema ready ({len(CONSTRAINTS)} constraints, {len(INDEXES)} indexes, version {len(BACKFILLS)})")
+
+
+if __name__ == "__main__":
+    ensure_schema()
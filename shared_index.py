@@ -0,0 +1,151 @@
+# shared_index.py
+"""
+Per-repo embedding matrices as memory-mapped .npy files, shared by every
+worker process on the host.
+
+Set SHARED_INDEX_DIR to enable. A promoted repo never changes (re-ingests
+get a new repo_id), so each repo is written once, atomically, and every
+uvicorn/gunicorn worker attaches it read-only with np.load(mmap_mode="r").
+The pages live in the OS page cache, so N workers share one copy instead
+of each holding its own.
+
+Pre-fork: warm the hot repos before starting the workers,
+
+    python shared_index.py warm <repo_id> [<repo_id> ...]
+    uvicorn app:app --workers 4
+
+Repos that were not warmed are published by the first worker that scans
+them, or by ingest right after promotion. Deleting or replacing a repo
+drops its files at once; every worker checks the file is still there
+before serving from an attached copy, so none keeps answering from it.
+"""
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import numpy as np
+from graph_store import get_store
+
+SHARED_INDEX_DIR = os.getenv("SHARED_INDEX_DIR")
+# Attached repos kept open per process; the mapped pages themselves are shared
+SHARED_INDEX_MAX_OPEN = int(os.getenv("SHARED_INDEX_MAX_OPEN", "256"))
+
+
+class _Attached:
+    __slots__ = ("ids", "file_paths", "matrix", "rows_by_file")
+
+    def __init__(self, ids, file_paths, matrix):
+        self.ids = ids
+        self.file_paths = file_paths
+        self.matrix = matrix
+        self.rows_by_file = {}
+        for i, path in enumerate(file_paths):
+            self.rows_by_file.setdefault(path, []).append(i)
+
+
+class SharedIndex:
+    def __init__(self, directory: str, max_open: int = SHARED_INDEX_MAX_OPEN):
+        self.directory = directory
+        self.max_open = max_open
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, repo_id: str) -> Tuple[str, str]:
+        base = os.path.join(self.directory, repo_id)
+        return base + ".npy", base + ".json"
+
+    def publish(self, repo_id: str, ids: List[str], file_paths: List[str], matrix: np.ndarray):
+        """Write a repo's vectors. The .npy is renamed into place last, so its presence means complete."""
+        matrix_path, meta_path = self._paths(repo_id)
+        tmp = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(meta_path + tmp, "w") as f:
+            json.dump({"ids": ids, "file_paths": file_paths}, f)
+        os.replace(meta_path + tmp, meta_path)
+        with open(matrix_path + tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+        os.replace(matrix_path + tmp, matrix_path)
+
+    def attach(self, repo_id: str) -> Optional[_Attached]:
+        matrix_path, meta_path = self._paths(repo_id)
+        with self._lock:
+            attached = self._open.get(repo_id)
+            if attached is not None:
+                # Another worker may have dropped the repo since we attached it
+                if os.path.exists(matrix_path):
+                    self._open.move_to_end(repo_id)
+                    return attached
+                del self._open[repo_id]
+        try:
+            matrix = np.load(matrix_path, mmap_mode="r")
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        attached = _Attached(meta["ids"], meta["file_paths"], matrix)
+        with self._lock:
+            self._open[repo_id] = attached
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+        return attached
+
+    def drop(self, repo_id: str):
+        with self._lock:
+            self._open.pop(repo_id, None)
+        for path in self._paths(repo_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def warm(self, repo_id: str) -> Optional[_Attached]:
+        """Attach a repo, publishing it from the store first if it is live and not on disk yet."""
+        attached = self.attach(repo_id)
+        if attached is not None:
+            return attached
+        store = get_store()
+        try:
+            if store.get_repo_metadata(repo_id).get("status", "ready") != "ready":
+                return None     # still ingesting: its vectors are not final
+        except ValueError:
+            return None
+        ids, file_paths, matrix = store.scan_vectors(repo_id)
+        if not ids:
+            return None
+        self.publish(repo_id, list(ids), list(file_paths), matrix)
+        return self.attach(repo_id)
+
+    def scan_vectors(self, repo_id: str, paths: List[str] = None):
+        """Same contract as GraphStore.scan_vectors, served from the mapped file."""
+        attached = self.warm(repo_id)
+        if attached is None:
+            return get_store().scan_vectors(repo_id, paths)
+        if paths is None:
+            return attached.ids, attached.file_paths, attached.matrix
+        rows = [i for p in paths for i in attached.rows_by_file.get(p, ())]
+        return [attached.ids[i] for i in rows], [attached.file_paths[i] for i in rows], attached.matrix[rows]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> Optional[SharedIndex]:
+    """The process-wide SharedIndex, or None when SHARED_INDEX_DIR is unset."""
+    global _index
+    if _index is None and SHARED_INDEX_DIR:
+        with _index_lock:
+            if _index is None:
+                _index = SharedIndex(SHARED_INDEX_DIR)
+    return _index
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "warm" or get_index() is None:
+        sys.exit("usage: SHARED_INDEX_DIR=... python shared_index.py warm <repo_id> [<repo_id> ...]")
+    get_store().setup()
+    for repo_id in sys.argv[2:]:
+        attached = get_index().warm(repo_id)
+        print(f"{'✓' if attached else '⚠️ '} {repo_id}: {len(attached.ids) if attached else 'not published'}")
@@ -1,14 +1,27 @@
 # supabase_client.py
 import os
+import threading
 from uuid import UUID
-from supabase import create_client
 from dotenv import load_dotenv
 
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+_supabase = None
+_supabase_lock = threading.Lock()
+
+
+def get_supabase():
+    """The Supabase client, created on first use."""
+    global _supabase
+    if _supabase is None:
+        with _supabase_lock:
+            if _supabase is None:
+                from supabase import create_client
+                _supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    return _supabase
 
 
 def convert_uuids_to_strings(obj):
@@ -25,7 +38,7 @@ def convert_uuids_to_strings(obj):
 
 def insert_repo(owner, repo, branch="main", user_id=None):
     # insert returns a SyncQueryRequestBuilder; you call .execute() to get the result
-    res = supabase.table("repos").insert({
+    res = get_supabase().table("repos").insert({
         "owner": owner,
         "repo": repo,
         "branch": branch,
@@ -47,7 +60,7 @@ def insert_repo(owner, repo, branch="main", user_id=None):
 def insert_chunks(rows):
     """Insert multiple chunk rows into Supabase."""
     rows = convert_uuids_to_strings(rows)
-    res = supabase.table("repo_chunks").insert(rows).execute()
+    res = get_supabase().table("repo_chunks").insert(rows).execute()
 
     # Debug
     print("res.data:", res.data)
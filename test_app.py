@@ -0,0 +1,136 @@
+# test_app.py
+import pytest
+from fastapi.testclient import TestClient
+from graph_store import set_store
+from memory_store import MemoryStore
+from auth import create_access_token
+import query_engine
+import app as app_module
+
+
+@pytest.fixture
+def client(monkeypatch):
+    store = MemoryStore()
+    store.setup()
+    set_store(store)
+    # No OpenAI: every question embeds to the same vector and the answer names its sources
+    monkeypatch.setattr(query_engine, "embed_query", lambda text: [1.0, 0.0])
+    monkeypatch.setattr(query_engine, "ask_chat", lambda prompt: "answer")
+    yield TestClient(app_module.app), store
+    set_store(None)
+
+
+def add_repo(store, name, user_id, vector):
+    repo_id = store.insert_repo("o", name, user_id=user_id)
+    store.create_file_nodes(repo_id, ["a.py"])
+    store.insert_chunks(repo_id, [{"id": f"{name}-0", "file_path": "a.py", "chunk_index": 0,
+                                   "hash": f"{name}-h", "content": "x", "embedding": vector}])
+    store.promote_repo(repo_id)
+    return repo_id
+
+
+def auth(user_id):
+    return {"Authorization": f"Bearer {create_access_token({'sub': user_id})}"}
+
+
+def test_scope_must_be_exactly_one(client):
+    c, store = client
+    repo_id = add_repo(store, "r", "u1", [1.0, 0.0])
+    for body in ({}, {"repo_id": repo_id, "repo_ids": [repo_id]}, {"repo_id": repo_id, "my_repos": True}):
+        assert c.post("/query", json={"question": "q", **body}).status_code == 400
+
+
+def test_my_repos_takes_the_user_from_the_token(client):
+    c, store = client
+    mine = add_repo(store, "mine", "u1", [1.0, 0.0])
+    add_repo(store, "theirs", "u2", [1.0, 0.0])
+
+    assert c.post("/query", json={"question": "q", "my_repos": True}).status_code == 401
+    # user_id in the body is not a scope any more
+    assert c.post("/query", json={"question": "q", "user_id": "u2"}).status_code == 400
+
+    r = c.post("/query", json={"question": "q", "my_repos": True}, headers=auth("u1"))
+    assert r.status_code == 200
+    assert {s["repo_id"] for s in r.json()["sources"]} == {mine}
+    assert c.post("/query", json={"question": "q", "my_repos": True}, headers=auth("nobody")).status_code == 404
+
+
+def test_sources_name_their_repo(client):
+    c, store = client
+    close = add_repo(store, "close", None, [1.0, 0.1])
+    far = add_repo(store, "far", None, [0.1, 1.0])
+    r = c.post("/query", json={"question": "q", "repo_ids": [far, close], "top_k": 2})
+    assert r.status_code == 200
+    sources = r.json()["sources"]
+    assert [(s["repo_id"], s["file_path"]) for s in sources] == [(close, "a.py"), (far, "a.py")]
+    assert sources[0]["score"] > sources[1]["score"]
+
+
+def test_deleted_and_unknown_repos_are_404_before_embedding(client, monkeypatch):
+    c, store = client
+    def no_embedding(*args):
+        raise AssertionError("embedded a question for a missing repo")
+    monkeypatch.setattr(query_engine, "embed_query", no_embedding)
+    monkeypatch.setattr(query_engine, "embed_queries", no_embedding)
+    live = add_repo(store, "live", None, [1.0, 0.0])
+    gone = add_repo(store, "gone", None, [1.0, 0.0])
+    store.delete_repo(gone)
+    unknown = "00000000-0000-0000-0000-000000000000"
+
+    for repo_id in (gone, unknown):
+        assert c.post("/query", json={"question": "q", "repo_id": repo_id}).status_code == 404
+        assert c.post("/query/batch", json={"questions": ["q"], "repo_id": repo_id}).status_code == 404
+    assert c.post("/query", json={"question": "q", "repo_ids": [live, gone]}).status_code == 404
+
+
+def test_replaced_ids_are_404(client):
+    c, store = client
+    old = add_repo(store, "r", "u1", [1.0, 0.0])
+    new = add_repo(store, "r", "u1", [1.0, 0.0])
+    assert store.list_deleted_repos() == [old]
+    assert c.post("/query", json={"question": "q", "repo_id": old}).status_code == 404
+    assert c.get(f"/repo-metadata/{old}", headers=auth("u1")).status_code == 404
+    assert c.post("/query", json={"question": "q", "repo_id": new}).status_code == 200
+
+
+def test_only_the_owner_deletes_a_repo(client):
+    c, store = client
+    owned = add_repo(store, "owned", "u1", [1.0, 0.0])
+    ownerless = add_repo(store, "ownerless", None, [1.0, 0.0])
+    assert c.delete(f"/repos/{owned}", headers=auth("u2")).status_code == 403
+    assert c.delete(f"/repos/{ownerless}", headers=auth("u2")).status_code == 403
+    assert c.delete(f"/repos/{owned}", headers=auth("u1")).status_code == 200
+    assert c.delete(f"/repos/{owned}", headers=auth("u1")).status_code == 404
+    assert store.list_deleted_repos() == [owned]
+
+
+def test_totals_cover_every_page(client, monkeypatch):
+    c, store = client
+    for i in range(5):
+        add_repo(store, f"r{i}", "u1", [1.0, 0.0])
+    page = c.get("/my-repos?limit=2", headers=auth("u1")).json()
+    assert len(page["repos"]) == 2 and page["total_repos"] == 5 and page["next_cursor"]
+
+    monkeypatch.setattr(app_module, "iter_files", lambda owner, repo, branch: iter(f"f{i}.py" for i in range(7)))
+    page = c.get("/debug/list-files?owner=o&repo=r&limit=3").json()
+    assert page["files"] == ["f0.py", "f1.py", "f2.py"] and page["total_files"] == 7
+    page = c.get(f"/debug/list-files?owner=o&repo=r&limit=3&cursor={page['next_cursor']}").json()
+    assert page["files"] == ["f3.py", "f4.py", "f5.py"] and page["total_files"] == 7
+
+
+def test_sources_flag_neighbor_chunks(client):
+    c, store = client
+    repo_id = store.insert_repo("o", "r")
+    store.create_file_nodes(repo_id, ["a.py", "b.py"])
+    store.create_dep_relations(repo_id, [("a.py", "b.py")])
+    store.insert_chunks(repo_id, [
+        {"id": "a0", "file_path": "a.py", "chunk_index": 0, "hash": "ha", "content": "x", "embedding": [1.0, 0.0]},
+        {"id": "b0", "file_path": "b.py", "chunk_index": 0, "hash": "hb", "content": "y", "embedding": [0.0, 1.0]},
+    ])
+    store.promote_repo(repo_id)
+    r = c.post("/query", json={"question": "q", "repo_ids": [repo_id], "top_k": 1})
+    assert [(s["file_path"], s["neighbor"]) for s in r.json()["sources"]] == [("a.py", False)]
+
+    # Neighbour chunks are opt-in, and cited as such
+    chunks = query_engine.rank_across_repos([repo_id], [1.0, 0.0], 1, neighbor_chunks=1)
+    assert [(s["file_path"], s["neighbor"]) for s in map(query_engine.source, chunks)] == [("a.py", False), ("b.py", True)]
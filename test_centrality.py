@@ -0,0 +1,22 @@
+# test_centrality.py
+from centrality import dependency_centrality
+
+
+def test_pagerank_favours_shared_dependencies():
+    paths = ["app.py", "api.py", "cli.py", "utils.py", "orphan.py"]
+    edges = [("app.py", "utils.py"), ("api.py", "utils.py"), ("cli.py", "utils.py"),
+             ("app.py", "api.py"), ("app.py", "app.py"), ("app.py", "external.py")]
+    scores = dependency_centrality(paths, edges)
+
+    assert set(scores) == set(paths)
+    assert abs(sum(s["pagerank"] for s in scores.values()) - 1) < 1e-6
+    assert max(scores, key=lambda p: scores[p]["pagerank"]) == "utils.py"
+    assert scores["utils.py"]["in_degree"] == 3
+    assert scores["app.py"]["in_degree"] == 0   # self-edges are ignored
+    assert scores["api.py"]["pagerank"] > scores["cli.py"]["pagerank"]
+
+
+def test_empty_graph():
+    assert dependency_centrality([], []) == {}
+    scores = dependency_centrality(["a.py", "b.py"], [])
+    assert scores["a.py"]["pagerank"] == scores["b.py"]["pagerank"] == 0.5
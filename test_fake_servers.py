@@ -0,0 +1,52 @@
+# test_fake_servers.py
+# github_fetcher and the OpenAI client against the local fakes used by benchmark.py
+import pytest
+from openai import OpenAI
+import github_fetcher
+from fake_servers import FakeEncoding, FakeGitHub, FakeOpenAI
+
+
+@pytest.fixture(scope="module")
+def github():
+    server = FakeGitHub(num_files=20, lines_per_file=5).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(scope="module")
+def openai_server():
+    server = FakeOpenAI(dim=16).start()
+    yield server
+    server.stop()
+
+
+def test_list_and_fetch(github, monkeypatch):
+    monkeypatch.setattr(github_fetcher, "GITHUB_API_URL", github.url)
+    monkeypatch.setattr(github_fetcher, "GITHUB_RAW_URL", github.url)
+    files = github_fetcher.list_files("o", "r")
+    assert len(files) == 20
+    assert github_fetcher.fetch_raw("o", "r", files[0]) == github.files[files[0]]
+
+
+def test_embeddings_are_deterministic(openai_server):
+    client = OpenAI(api_key="test", base_url=f"{openai_server.url}/v1")
+    first = client.embeddings.create(model="m", input=["a", "b"]).data
+    second = client.embeddings.create(model="m", input="a").data
+    assert len(first[0].embedding) == 16
+    assert first[0].embedding == second[0].embedding
+    assert first[0].embedding != first[1].embedding
+
+    reply = client.chat.completions.create(model="m", messages=[{"role": "user", "content": "hi"}])
+    assert reply.choices[0].message.content.startswith("Synthetic answer")
+
+
+def test_fake_encoding_round_trips_through_the_chunker(monkeypatch):
+    import chunker
+    encoding = FakeEncoding()
+    text = "def f(x):\n    return x + 1\n" * 50
+    assert encoding.decode(encoding.encode(text)) == text
+    assert encoding.encode(text) == encoding.encode(text)
+
+    monkeypatch.setattr(chunker, "_encoding", encoding)
+    chunks = chunker.chunk_text_by_tokens(text, max_tokens=40, overlap=5)
+    assert len(chunks) > 1 and text.startswith(chunks[0]) and text.endswith(chunks[-1])
@@ -0,0 +1,107 @@
+# test_garbage_collector.py
+import pytest
+from memory_store import MemoryStore
+from garbage_collector import collect
+
+
+def ingest(store, branch, n_chunks, shared=0):
+    repo_id = store.insert_repo("o", "r", branch)
+    store.create_file_nodes(repo_id, ["a.py", "b.py"])
+    store.create_dep_relations(repo_id, [("a.py", "b.py")])
+    store.insert_chunks(repo_id, [
+        {"id": f"{branch}{i}", "file_path": "a.py", "chunk_index": i,
+         "hash": f"shared{i}" if i < shared else f"{branch}-h{i}", "content": "x", "embedding": [1.0, 0.0]}
+        for i in range(n_chunks)
+    ])
+    store.promote_repo(repo_id)
+    return repo_id
+
+
+def test_collect_purges_in_batches_and_keeps_shared_bodies(tmp_path):
+    store = MemoryStore(str(tmp_path / "graph.db"))
+    store.setup()
+    main = ingest(store, "main", 25, shared=10)
+    dev = ingest(store, "dev", 10, shared=10)
+
+    assert store.delete_repo(main)
+    with pytest.raises(ValueError):
+        store.get_repo_metadata(main)
+    assert store.scan_vectors(main)[0] == []
+
+    batches = []
+    while True:
+        n = store.purge_repo(main, batch_size=10)
+        if not n:
+            break
+        batches.append(n)
+    assert batches == [10, 10, 5, 2, 1]   # chunks, then files, then the repo
+
+    assert main not in store.repos and store.list_deleted_repos() == []
+    assert sorted(store.bodies) == [f"shared{i}" for i in range(10)]
+    assert all(b["refcount"] == 1 for b in store.bodies.values())
+    assert len(store.fetch_chunks([f"dev{i}" for i in range(10)])) == 10
+
+    assert store.delete_repo(dev)
+    assert collect(store, batch_size=4) == 10 + 2 + 1
+    assert store.bodies == {}
+    assert store._db.execute("SELECT count(*) FROM chunks").fetchone()[0] == 0
+    assert store._db.execute("SELECT count(*) FROM chunk_bodies").fetchone()[0] == 0
+
+
+def test_tombstones_survive_a_restart(tmp_path):
+    path = str(tmp_path / "graph.db")
+    store = MemoryStore(path)
+    store.setup()
+    repo_id = ingest(store, "main", 3)
+    store.delete_repo(repo_id)
+    store.close()
+
+    reloaded = MemoryStore(path)
+    reloaded.setup()
+    assert reloaded.list_deleted_repos() == [repo_id]
+    assert reloaded.scan_vectors(repo_id)[0] == []
+    assert collect(reloaded) == 3 + 2 + 1
+    assert reloaded._db.execute("SELECT count(*) FROM repos").fetchone()[0] == 0
+
+
+def test_stale_ingests_are_expired_and_never_listed(tmp_path):
+    path = str(tmp_path / "graph.db")
+    store = MemoryStore(path)
+    store.setup()
+    live = ingest(store, "main", 2)
+    crashed = store.insert_repo("o", "r", "main")
+    store.create_file_nodes(crashed, ["a.py"])
+    running = store.insert_repo("o", "other", "main")
+    store.repos[crashed]["started_at"] -= 3600
+
+    owned = store.insert_repo("o", "r", "dev", user_id="u")
+    assert store.get_user_repos("u") == []   # half-written repos are not listed
+    store.promote_repo(owned)
+    assert [r["id"] for r in store.get_user_repos("u")] == [owned]
+
+    assert collect(store, ingest_timeout=60) == 1 + 1   # the crashed ingest's file and repo
+    assert crashed not in store.repos
+    assert store.repos[running]["status"] == "ingesting"
+    assert store.repos[live]["status"] == "ready"
+    store.close()
+
+    # started_at is persisted, so a restart does not reset the clock
+    reloaded = MemoryStore(path)
+    reloaded.setup()
+    assert reloaded.expire_ingests(0) == [running]
+
+
+def test_collect_only_runs_while_the_lease_is_held(tmp_path):
+    store = MemoryStore(str(tmp_path / "graph.db"))
+    store.setup()
+    first, second = ingest(store, "main", 3), ingest(store, "dev", 3)
+    store.delete_repo(first)
+    store.delete_repo(second)
+
+    assert collect(store, lease=lambda: False) == 0
+    assert sorted(store.list_deleted_repos()) == sorted([first, second])
+
+    # Lost after the first repo: the pass stops there
+    answers = iter([True, True, False])
+    assert collect(store, lease=lambda: next(answers)) == 3 + 2 + 1
+    assert len(store.list_deleted_repos()) == 1
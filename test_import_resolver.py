@@ -0,0 +1,82 @@
+# test_import_resolver.py
+from import_resolver import PathIndex, parse_jsonc, detect_imports
+
+FILES = [
+    "app/__init__.py",
+    "app/main.py",
+    "app/models.py",
+    "app/api/__init__.py",
+    "app/api/routes.py",
+    "app/api/deps.py",
+    "src/pkg/core.py",
+    "src/pkg/util.py",
+    "web/tsconfig.json",
+    "web/src/index.ts",
+    "web/src/lib/api.ts",
+    "web/src/components/index.tsx",
+    "web/src/components/Button.tsx",
+    "web/src/pages/home.jsx",
+]
+
+TSCONFIG = """{
+  // comments and trailing commas are allowed
+  "compilerOptions": {
+    "baseUrl": "./src",
+    "paths": {
+      "@/*": ["*"],  /* alias to src */
+      "@components": ["components/index.tsx"],
+    },
+  },
+}"""
+
+
+def make_index():
+    return PathIndex(FILES, {"web/tsconfig.json": TSCONFIG})
+
+
+def test_python_absolute_and_attribute_imports():
+    index = make_index()
+    assert index.resolve("app/main.py", "app.models") == "app/models.py"
+    assert index.resolve("app/main.py", "app.models.User") == "app/models.py"
+    assert index.resolve("app/main.py", "app.api") == "app/api/__init__.py"
+    assert index.resolve("app/main.py", "os") is None
+    assert index.resolve("app/api/routes.py", "os.path") is None
+
+
+def test_python_source_root_from_ancestor():
+    # src/ layout: "pkg.util" is importable from within src/
+    assert make_index().resolve("src/pkg/core.py", "pkg.util") == "src/pkg/util.py"
+
+
+def test_python_package_relative():
+    index = make_index()
+    assert index.resolve("app/api/routes.py", ".deps") == "app/api/deps.py"
+    assert index.resolve("app/api/routes.py", "..models") == "app/models.py"
+    assert index.resolve("app/api/routes.py", ".") == "app/api/__init__.py"
+    assert index.resolve("app/api/routes.py", ".missing") == "app/api/__init__.py"
+
+
+def test_js_relative_and_index():
+    index = make_index()
+    assert index.resolve("web/src/pages/home.jsx", "../lib/api") == "web/src/lib/api.ts"
+    assert index.resolve("web/src/pages/home.jsx", "../components") == "web/src/components/index.tsx"
+    assert index.resolve("web/src/index.ts", "./components/Button.tsx") == "web/src/components/Button.tsx"
+    assert index.resolve("web/src/index.ts", "react") is None
+
+
+def test_tsconfig_paths_and_base_url():
+    index = make_index()
+    assert index.resolve("web/src/pages/home.jsx", "@/lib/api") == "web/src/lib/api.ts"
+    assert index.resolve("web/src/pages/home.jsx", "@components") == "web/src/components/index.tsx"
+    assert index.resolve("web/src/pages/home.jsx", "components/Button") == "web/src/components/Button.tsx"
+
+
+def test_parse_jsonc_keeps_comment_like_strings():
+    assert parse_jsonc('{"a": "@/*", // x\n "b": [1,],}') == {"a": "@/*", "b": [1]}
+
+
+def test_detect_imports():
+    py = "from . import deps, models as m\nfrom ..core import (\n    a,\n)\nimport app.models\n"
+    assert set(detect_imports("app/api/routes.py", py)) == {".", ".deps", ".models", "..core", "app.models"}
+    js = "import x from './a';\nimport './styles.css';\nexport { b } from '../b';\nconst c = require('c');\n"
+    assert set(detect_imports("web/src/index.ts", js)) == {"./a", "./styles.css", "../b", "c"}
@@ -0,0 +1,203 @@
+# test_memory_store.py
+import numpy as np
+import pytest
+from memory_store import MemoryStore
+
+
+def make_store(path=None):
+    store = MemoryStore(path)
+    store.setup()
+    return store
+
+
+def ready_repo(store, *args, **kwargs):
+    repo_id = store.insert_repo(*args, **kwargs)
+    store.promote_repo(repo_id)
+    return repo_id
+
+
+def test_users_and_keyset_pages():
+    store = make_store()
+    ids = sorted(store.create_user(f"u{i}@x.io", "pw") for i in range(5))
+    assert store.get_user_by_email("u0@x.io")["password"] == "pw"
+    assert store.get_user_by_email_or_id("u1@x.io")["email"] == "u1@x.io"
+
+    page = store.list_users(limit=2)
+    assert [u["user_id"] for u in page] == ids[:2]
+    rest = list(store.iter_users(after=page[-1]["user_id"]))
+    assert [u["user_id"] for u in rest] == ids[2:]
+
+
+def test_user_repos_descending():
+    store = make_store()
+    ids = sorted(ready_repo(store, "o", f"r{i}", user_id="u") for i in range(4))
+    page = store.get_user_repos("u", limit=2)
+    assert [r["id"] for r in page] == ids[::-1][:2]
+    assert [r["id"] for r in store.iter_user_repos("u", before=page[-1]["id"])] == ids[::-1][2:]
+
+
+def test_chunks_and_dependencies():
+    store = make_store()
+    repo_id = store.insert_repo("o", "r")
+    store.create_file_nodes(repo_id, ["a.py", "b.py", "c.py"])
+    store.create_dep_relations(repo_id, [("a.py", "b.py"), ("b.py", "c.py")])
+    rows = [
+        {"id": f"c{i}", "file_path": "a.py", "chunk_index": i, "hash": f"h{i}", "content": f"chunk {i}", "embedding": [float(i)] * 4}
+        for i in range(100)
+    ]
+    store.insert_chunks(repo_id, rows)
+
+    ids, paths, matrix = store.scan_vectors(repo_id)
+    assert len(ids) == 100 and matrix.shape == (100, 4)
+    assert matrix.dtype == np.float32
+    assert np.allclose(matrix[99], 99.0)
+    chunks = store.fetch_chunks(["c99", "missing", "c3"])
+    assert [c["content"] for c in chunks] == ["chunk 99", "chunk 3"]
+    assert store.get_dependencies(repo_id, ["a.py"], depth=1) == {"a.py": ["b.py"]}
+    assert store.get_dependencies(repo_id, ["a.py", "x.py"]) == {"a.py": ["b.py", "c.py"], "x.py": []}
+
+    store.set_file_centrality(repo_id, {"b.py": {"pagerank": 0.5, "in_degree": 1}})
+    graph = store.get_file_graph(repo_id)
+    assert graph["a.py"] == {"pagerank": 0.0, "in_degree": 0, "neighbors": ["b.py"]}
+    assert graph["b.py"]["pagerank"] == 0.5
+
+
+def test_file_vectors_narrow_the_scan():
+    store = make_store()
+    repo_id = store.insert_repo("o", "r")
+    store.create_file_nodes(repo_id, ["a.py", "b.py"])
+    store.insert_chunks(repo_id, [
+        {"id": f"{p}{i}", "file_path": p, "chunk_index": i, "hash": f"{p}{i}", "content": "", "embedding": [float(i), 1.0]}
+        for p in ("a.py", "b.py") for i in range(3)
+    ])
+    store.set_file_vectors(repo_id, {"a.py": [1.0, 0.0], "b.py": [0.0, 1.0], "gone.py": [1.0, 1.0]})
+
+    paths, matrix = store.scan_file_vectors(repo_id)
+    assert sorted(paths) == ["a.py", "b.py"] and matrix.shape == (2, 2)
+    ids, file_paths, vectors = store.scan_vectors(repo_id, ["b.py"])
+    assert ids == ["b.py0", "b.py1", "b.py2"] and set(file_paths) == {"b.py"}
+    assert np.allclose(vectors[:, 0], [0, 1, 2])
+
+
+def test_sqlite_round_trip(tmp_path):
+    path = str(tmp_path / "graph.db")
+    store = make_store(path)
+    user_id = store.create_user("a@x.io", "pw")
+    repo_id = store.insert_repo("o", "r", user_id=user_id)
+    store.create_file_nodes(repo_id, ["a.py", "b.py"])
+    store.create_dep_relations(repo_id, [("a.py", "b.py")])
+    store.insert_chunks(repo_id, [{"id": "c0", "file_path": "b.py", "chunk_index": 0, "hash": "hx", "content": "x", "embedding": [1.0, 2.0]}])
+    store.set_file_vectors(repo_id, {"b.py": [1.0, 2.0]})
+    store.promote_repo(repo_id)
+    store.close()
+
+    reloaded = make_store(path)
+    assert reloaded.get_user_by_email("a@x.io")["user_id"] == user_id
+    assert reloaded.get_user_repos(user_id)[0]["id"] == repo_id
+    assert reloaded.get_dependencies(repo_id, ["a.py"]) == {"a.py": ["b.py"]}
+    assert reloaded.scan_vectors(repo_id)[0] == ["c0"]
+    assert reloaded.fetch_chunks(["c0"])[0]["content"] == "x"
+    assert reloaded.scan_file_vectors(repo_id)[0] == ["b.py"]
+    assert reloaded.scan_vectors(repo_id, ["b.py"])[0] == ["c0"]
+
+
+def test_chunk_bodies_are_shared_and_persisted(tmp_path):
+    path = str(tmp_path / "graph.db")
+    store = make_store(path)
+    repos = [store.insert_repo("o", "r", branch) for branch in ("main", "dev")]
+    for repo_id in repos:
+        store.create_file_nodes(repo_id, ["a.py"])
+    store.insert_chunks(repos[0], [{"id": "m0", "file_path": "a.py", "chunk_index": 0, "hash": "h", "content": "x", "embedding": [1.0, 0.0]}])
+
+    # An existing body is reused as stored; one that was collected after the
+    # caller looked it up ("gone") is re-created from the row
+    assert list(store.get_body_vectors(["h", "gone"])) == ["h"]
+    store.insert_chunks(repos[1], [
+        {"id": "d0", "file_path": "a.py", "chunk_index": 0, "hash": "h", "content": "x", "embedding": [9.0, 9.0]},
+        {"id": "d1", "file_path": "a.py", "chunk_index": 1, "hash": "gone", "content": "y", "embedding": [0.0, 1.0]},
+    ])
+    assert store.bodies["h"]["refcount"] == 2 and store.bodies["gone"]["refcount"] == 1
+    assert np.allclose(store.scan_vectors(repos[1])[2], [[1.0, 0.0], [0.0, 1.0]])
+    # A chunk written before bodies were shared keeps its own content and embedding
+    store._db.execute("INSERT INTO chunks (id, repo_id, file_path, chunk_index, content, embedding) VALUES (?, ?, ?, ?, ?, ?)",
+                      ("old", repos[1], "a.py", 9, "legacy", np.array([0.0, 1.0], dtype=np.float32).tobytes()))
+    store._db.commit()
+    store.close()
+
+    reloaded = make_store(path)
+    assert reloaded.bodies["h"]["refcount"] == 2
+    assert [c["content"] for c in reloaded.fetch_chunks(["m0", "d0", "old"])] == ["x", "x", "legacy"]
+    assert reloaded._db.execute("SELECT count(*) FROM chunk_bodies").fetchone()[0] == 2
+
+
+def test_promote_replaces_previous_ingest():
+    store = make_store()
+    first = store.insert_repo("o", "r", "main", user_id="u")
+    assert store.promote_repo(first) == []
+    other_branch = store.insert_repo("o", "r", "dev", user_id="u")
+    store.promote_repo(other_branch)
+
+    second = store.insert_repo("o", "r", "main", user_id="u")
+    assert store.promote_repo(second) == [first]
+    assert store.repos[second]["generation"] == 1
+    assert sorted(r["id"] for r in store.get_user_repos("u")) == sorted([second, other_branch])
+    assert store.list_deleted_repos() == [first]
+    assert store.delete_repo(first) is False
+    assert store.get_repo_statuses([first, second, "unknown"]) == {first: "deleted", second: "ready"}
+
+
+def test_promote_never_revives_a_deleted_repo():
+    store = make_store()
+    repo_id = store.insert_repo("o", "r", user_id="u")
+    assert store.delete_repo(repo_id)
+    with pytest.raises(ValueError):
+        store.promote_repo(repo_id)
+    with pytest.raises(ValueError):
+        store.promote_repo("unknown")
+    assert store.repos[repo_id]["status"] == "deleted"
+    assert store.list_deleted_repos() == [repo_id]
+    while store.purge_repo(repo_id):
+        pass
+    assert repo_id not in store.repos
+
+
+def test_writes_are_rejected_once_the_repo_is_deleted():
+    store = make_store()
+    repo_id = store.insert_repo("o", "r")
+    assert store.create_file_nodes(repo_id, ["a.py", "b.py"])
+    assert store.create_dep_relations(repo_id, [("a.py", "b.py"), ("a.py", "elsewhere.py")])
+    assert store.get_dependencies(repo_id, ["a.py"]) == {"a.py": ["b.py"]}
+    assert sorted(store.files[repo_id]) == ["a.py", "b.py"]
+
+    store.delete_repo(repo_id)
+    row = {"id": "c0", "file_path": "a.py", "chunk_index": 0, "hash": "h", "content": "x", "embedding": [1.0]}
+    assert store.insert_chunks(repo_id, [row]) is False
+    assert store.create_file_nodes(repo_id, ["c.py"]) is False
+    assert store.create_dep_relations(repo_id, [("a.py", "b.py")]) is False
+    assert store.set_file_vectors(repo_id, {"a.py": [1.0]}) is False
+    assert store.set_file_centrality(repo_id, {"a.py": {"pagerank": 1.0, "in_degree": 0}}) is False
+    assert "h" not in store.bodies and repo_id not in store.file_vectors and repo_id not in store.file_centrality
+
+
+def test_ingest_stops_at_the_first_rejected_write(monkeypatch):
+    import chunker
+    import ingest
+    from fake_servers import FakeEncoding
+    store = make_store()
+    repo_id = store.insert_repo("o", "r")
+    fetched = []
+
+    def fetch_raw(owner, repo, path, branch):
+        # The repo is deleted while the first file is being fetched
+        fetched.append(path)
+        store.delete_repo(repo_id)
+        return "print('hi')\n"
+
+    monkeypatch.setattr(chunker, "_encoding", FakeEncoding())
+    monkeypatch.setattr(ingest, "list_files", lambda owner, repo, branch: ["a.py", "b.py"])
+    monkeypatch.setattr(ingest, "fetch_raw", fetch_raw)
+    monkeypatch.setattr(ingest, "embed_texts", lambda texts: [[1.0, 0.0] for _ in texts])
+    with pytest.raises(ValueError, match="deleted during ingest"):
+        ingest.ingest_files(store, repo_id, "o", "r", "main")
+    assert fetched == ["a.py"]
+    assert store.list_deleted_repos() == [repo_id]
@@ -0,0 +1,38 @@
+# test_metrics.py
+import metrics
+from metrics import Histogram, Counter, profile, stage, render
+
+
+def test_stage_is_noop_when_disabled(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    assert stage("embed") is stage("llm")
+
+
+def test_profile_collects_stages_without_metrics(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    with profile() as report:
+        with stage("retrieval"):
+            pass
+        with stage("llm"):
+            pass
+        with stage("llm"):
+            pass
+    assert set(report["stages_ms"]) == {"retrieval", "llm"}
+    assert report["total_ms"] >= 0
+    assert stage("llm") is metrics._NOOP
+
+
+def test_prometheus_text(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    hist = Histogram("test_seconds", "Test histogram.", ("stage",), buckets=(0.1, 1))
+    counter = Counter("test_total", "Test counter.", ("kind",))
+    hist.observe(0.5, "embed")
+    counter.inc(3, "prompt")
+
+    text = render()
+    assert "# TYPE test_seconds histogram" in text
+    assert 'test_seconds_bucket{stage="embed",le="0.1"} 0' in text
+    assert 'test_seconds_bucket{stage="embed",le="1"} 1' in text
+    assert 'test_seconds_bucket{stage="embed",le="+Inf"} 1' in text
+    assert 'test_seconds_count{stage="embed"} 1' in text
+    assert 'test_total{kind="prompt"} 3' in text
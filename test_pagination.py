@@ -0,0 +1,27 @@
+# test_pagination.py
+import pytest
+from pagination import encode_cursor, decode_cursor, paginate, ndjson
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor("src/app.py")) == "src/app.py"
+    assert decode_cursor(None) is None
+
+
+def test_bad_cursor_raises():
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_paginate_sets_next_cursor_only_when_more_rows():
+    rows = [{"id": str(i)} for i in range(4)]
+    page, cursor = paginate(rows, 3, "id")
+    assert [r["id"] for r in page] == ["0", "1", "2"]
+    assert decode_cursor(cursor) == "2"
+
+    page, cursor = paginate(rows[:3], 3, "id")
+    assert len(page) == 3 and cursor is None
+
+
+def test_ndjson():
+    assert list(ndjson([{"a": 1}, {"b": 2}])) == ['{"a": 1}\n', '{"b": 2}\n']
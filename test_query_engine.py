@@ -0,0 +1,72 @@
+# test_query_engine.py
+import numpy as np
+import pytest
+from graph_store import get_store, set_store
+from memory_store import MemoryStore
+from query_engine import select_chunks, select_chunks_batch, fetch_scored_batch, rank_across_repos
+
+
+def make_repo(n_files=6, per_file=5, dim=8, store=None, name="r", seed=1):
+    if store is None:
+        store = MemoryStore()
+        store.setup()
+        set_store(store)
+    repo_id = store.insert_repo("o", name)
+    paths = [f"f{i}.py" for i in range(n_files)]
+    store.create_file_nodes(repo_id, paths)
+    store.create_dep_relations(repo_id, [(paths[i], paths[i + 1]) for i in range(n_files - 1)])
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n_files * per_file, dim)).astype(np.float32)
+    store.insert_chunks(repo_id, [
+        {"id": f"{name}-c{i}", "file_path": paths[i // per_file], "chunk_index": i % per_file,
+         "hash": f"{name}-h{i}", "content": f"chunk {i}", "embedding": vectors[i].tolist()}
+        for i in range(len(vectors))
+    ])
+    store.set_file_vectors(repo_id, {p: vectors[i * per_file:(i + 1) * per_file].mean(axis=0).tolist()
+                                     for i, p in enumerate(paths)})
+    store.promote_repo(repo_id)
+    return repo_id, rng.standard_normal((4, dim)).astype(np.float32)
+
+
+def test_batch_matches_one_at_a_time():
+    repo_id, queries = make_repo()
+    for options in ({}, {"mode": "hierarchical", "top_files": 2}):
+        batch = select_chunks_batch(repo_id, queries, 3, **options)
+        single = [select_chunks(repo_id, q, 3, **options) for q in queries]
+        for (picks, neighbors), (want_picks, want_neighbors) in zip(batch, single):
+            # Matrix-matrix and matrix-vector products round float32 differently
+            assert [c for c, _ in picks] == [c for c, _ in want_picks]
+            assert [c for c, _ in neighbors] == [c for c, _ in want_neighbors]
+            assert [s for _, s in picks] == pytest.approx([s for _, s in want_picks], abs=1e-5)
+    set_store(None)
+
+
+def test_fetch_scored_batch_keeps_per_question_scores():
+    repo_id, _ = make_repo()
+    first, second = fetch_scored_batch([([("r-c0", 0.9)], [("r-c5", 0.1)]), ([("r-c0", 0.2)], [])])
+    assert [(c["id"], c["score"], c.get("neighbor", False)) for c in first] == [("r-c0", 0.9, False), ("r-c5", 0.1, True)]
+    assert [(c["id"], c["score"]) for c in second] == [("r-c0", 0.2)]
+    set_store(None)
+
+
+def test_rank_across_repos_merges_and_attributes():
+    first, queries = make_repo(name="a", seed=1)
+    store = get_store()
+    second, _ = make_repo(store=store, name="b", seed=2)
+    third, _ = make_repo(store=store, name="c", seed=3)
+    repo_of = {"a": first, "b": second, "c": third}
+    for q in queries:
+        # Pure relevance: the merged top-k is the top-k of the union
+        options = {"lambda_mult": 1.0, "centrality_weight": 0}
+        union = sorted((score, cid) for repo_id in repo_of.values()
+                       for cid, score in select_chunks(repo_id, q, 4, neighbor_chunks=0, **options)[0])[::-1][:4]
+        chunks = rank_across_repos(list(repo_of.values()), q, 4, neighbor_chunks=2, **options)
+        winners = [c for c in chunks if not c.get("neighbor")]
+        assert [c["id"] for c in winners] == [cid for _, cid in union]
+        assert [c["score"] for c in winners] == sorted((c["score"] for c in winners), reverse=True)
+        for c in chunks:
+            assert c["repo_id"] == repo_of[c["id"].split("-")[0]]
+        # Neighbours only come from repos that supplied a winner
+        assert {c["repo_id"] for c in chunks} <= {c["repo_id"] for c in winners}
+    assert rank_across_repos([], queries[0]) == []
+    set_store(None)
@@ -0,0 +1,56 @@
+# test_rerank.py
+import time
+import numpy as np
+from rerank import mmr
+
+
+def test_pure_relevance_keeps_score_order():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((50, 16))
+    relevance = rng.random(50)
+    assert mmr(vectors, relevance, 5, lambda_mult=1.0) == list(np.argsort(-relevance)[:5])
+
+
+def test_near_duplicates_are_demoted():
+    base = np.array([1.0, 0.0, 0.0])
+    vectors = np.array([base, base + [0, 0.01, 0], [0.0, 1.0, 0.0]])
+    relevance = np.array([0.9, 0.89, 0.5])
+    assert mmr(vectors, relevance, 2, lambda_mult=1.0) == [0, 1]
+    assert mmr(vectors, relevance, 2, lambda_mult=0.5) == [0, 2]
+
+
+def test_per_group_cap():
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((6, 8))
+    relevance = np.array([0.9, 0.8, 0.7, 0.6, 0.5, 0.4])
+    groups = ["a.py", "a.py", "a.py", "b.py", "b.py", "c.py"]
+    picks = mmr(vectors, relevance, 6, lambda_mult=1.0, groups=groups, max_per_group=1)
+    assert picks == [0, 3, 5]
+
+
+def test_edge_cases():
+    assert mmr(np.empty((0, 4)), np.empty(0), 5) == []
+    assert mmr(np.zeros((2, 4)), np.array([0.1, 0.2]), 5) == [1, 0]
+
+
+def test_truncated_dims_still_demote_duplicates():
+    rng = np.random.default_rng(3)
+    vectors = rng.standard_normal((3, 3072)).astype(np.float32)
+    vectors[1] = vectors[0] + 0.01 * rng.standard_normal(3072)
+    relevance = np.array([0.9, 0.89, 0.5])
+    assert mmr(vectors, relevance, 2, lambda_mult=0.5, dims=256) == [0, 2]
+
+
+def test_few_hundred_candidates_is_fast():
+    # Loose bound so shared CI runners don't flake; benchmark.py reports the
+    # real figure (well under a millisecond)
+    rng = np.random.default_rng(2)
+    vectors = rng.standard_normal((300, 3072)).astype(np.float32)
+    relevance = rng.random(300)
+    groups = [str(i % 40) for i in range(300)]
+    mmr(vectors, relevance, 25)
+    start = time.perf_counter()
+    for _ in range(20):
+        # k=25 is the top_k maximum
+        mmr(vectors, relevance, 25, groups=groups, max_per_group=2)
+    assert (time.perf_counter() - start) / 20 < 0.01
@@ -0,0 +1,109 @@
+# test_schema.py
+# EXPLAIN checks that the hot lookups are served by an index seek.
+# Needs a live Neo4j (NEO4J_URI / NEO4J_USER / NEO4J_PASS).
+import os
+import pytest
+
+if not os.getenv("NEO4J_URI"):
+    pytest.skip("NEO4J_URI not set", allow_module_level=True)
+
+from neo4j_client import (
+    get_driver,
+    CREATE_FILE_NODE_QUERY,
+    CREATE_DEP_RELATION_QUERY,
+    CREATE_FILE_NODES_QUERY,
+    CREATE_DEP_RELATIONS_QUERY,
+    INSERT_CHUNKS_QUERY,
+    SET_FILE_CENTRALITY_QUERY,
+    SET_FILE_VECTORS_QUERY,
+    LOCK_INGESTING_REPO_QUERY,
+    LOCK_REPO_KEY_QUERY,
+    GET_USER_REPOS_QUERY,
+    COUNT_USER_REPOS_QUERY,
+    GET_USER_BY_EMAIL_OR_ID_QUERY,
+    GET_REPO_QUERY,
+    GET_REPO_STATUSES_QUERY,
+    SCAN_VECTORS_QUERY,
+    SCAN_FILE_CHUNK_VECTORS_QUERY,
+    SCAN_FILE_VECTORS_QUERY,
+    FILE_GRAPH_QUERY,
+    FETCH_CHUNKS_QUERY,
+    GET_BODY_VECTORS_QUERY,
+    REPO_PREDECESSORS_QUERY,
+    PROMOTE_REPO_QUERY,
+    DELETED_REPOS_QUERY,
+    EXPIRE_INGESTS_QUERY,
+    ACQUIRE_LEASE_QUERY,
+    PURGE_CHUNKS_QUERY,
+    PURGE_FILES_QUERY,
+    PURGE_REPO_QUERY,
+    GRAPH_CONTEXT_QUERY,
+)
+from schema import ensure_schema, run_backfills, BACKFILLS, SCHEMA_VERSION_QUERY
+
+SCANS = {"AllNodesScan", "NodeByLabelScan"}
+
+
+def operators(plan):
+    ops = [plan["operatorType"].split("@")[0]]
+    for child in plan.get("children", []):
+        ops.extend(operators(child))
+    return ops
+
+
+def explain(query: str, **params):
+    with get_driver().session() as session:
+        return operators(session.run("EXPLAIN " + query, **params).consume().plan)
+
+
+def setup_module():
+    ensure_schema()
+
+
+@pytest.mark.parametrize("query,params", [
+    (GET_REPO_QUERY, {"repo_id": "r"}),
+    (GET_REPO_STATUSES_QUERY, {"ids": ["r"]}),
+    (SCAN_VECTORS_QUERY, {"repo_id": "r"}),
+    (SCAN_FILE_CHUNK_VECTORS_QUERY, {"repo_id": "r", "paths": ["a.py"]}),
+    (SCAN_FILE_VECTORS_QUERY, {"repo_id": "r"}),
+    (FILE_GRAPH_QUERY, {"repo_id": "r"}),
+    (FETCH_CHUNKS_QUERY, {"ids": ["c"]}),
+    (GET_BODY_VECTORS_QUERY, {"hashes": ["h"]}),
+    (REPO_PREDECESSORS_QUERY, {"repo_id": "r"}),
+    (PROMOTE_REPO_QUERY, {"repo_id": "r", "generation": 0}),
+    (DELETED_REPOS_QUERY, {}),
+    (EXPIRE_INGESTS_QUERY, {"cutoff": 0}),
+    (ACQUIRE_LEASE_QUERY, {"name": "gc", "holder": "h", "now": 0, "ttl": 1}),
+    (PURGE_CHUNKS_QUERY, {"repo_id": "r", "batch_size": 10}),
+    (PURGE_FILES_QUERY, {"repo_id": "r", "batch_size": 10}),
+    (PURGE_REPO_QUERY, {"repo_id": "r"}),
+    (GET_USER_REPOS_QUERY, {"user_id": "u", "before": None}),
+    (COUNT_USER_REPOS_QUERY, {"user_id": "u"}),
+    (GET_USER_BY_EMAIL_OR_ID_QUERY, {"identifier": "u"}),
+    (CREATE_FILE_NODE_QUERY, {"repo_id": "r", "path": "a.py"}),
+    (CREATE_DEP_RELATION_QUERY, {"repo_id": "r", "src": "a.py", "dst": "b.py"}),
+    (CREATE_FILE_NODES_QUERY, {"repo_id": "r", "paths": ["a.py"]}),
+    (CREATE_DEP_RELATIONS_QUERY, {"repo_id": "r", "edges": [["a.py", "b.py"]]}),
+    (INSERT_CHUNKS_QUERY, {"repo_id": "r", "rows": []}),
+    (SET_FILE_CENTRALITY_QUERY, {"repo_id": "r", "rows": []}),
+    (SET_FILE_VECTORS_QUERY, {"repo_id": "r", "rows": []}),
+    (LOCK_INGESTING_REPO_QUERY, {"repo_id": "r"}),
+    (LOCK_REPO_KEY_QUERY, {"repo_id": "r"}),
+    (GRAPH_CONTEXT_QUERY % 2, {"repo_id": "r", "paths": ["a.py"]}),
+    (SCHEMA_VERSION_QUERY, {}),
+])
+def test_hot_queries_use_index(query, params):
+    ops = explain(query, **params)
+    assert not SCANS & set(ops), ops
+    assert any("IndexSeek" in op for op in ops), ops
+
+
+def test_ensure_schema_is_idempotent():
+    ensure_schema()
+    ensure_schema()
+
+
+def test_backfills_run_once():
+    with get_driver().session() as session:
+        assert run_backfills(session) == 0
+        assert session.run(SCHEMA_VERSION_QUERY).single()["version"] == len(BACKFILLS)
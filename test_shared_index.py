@@ -0,0 +1,43 @@
+# test_shared_index.py
+import numpy as np
+from graph_store import set_store
+from memory_store import MemoryStore
+from shared_index import SharedIndex
+
+
+def test_publish_attach_and_scan(tmp_path):
+    index = SharedIndex(str(tmp_path))
+    matrix = np.arange(12, dtype=np.float32).reshape(4, 3)
+    index.publish("r1", ["c0", "c1", "c2", "c3"], ["a.py", "b.py", "a.py", "c.py"], matrix)
+
+    attached = index.attach("r1")
+    assert isinstance(attached.matrix, np.memmap)
+    ids, paths, vectors = index.scan_vectors("r1", ["a.py", "c.py"])
+    assert ids == ["c0", "c2", "c3"]
+    assert paths == ["a.py", "a.py", "c.py"]
+    assert np.array_equal(vectors, matrix[[0, 2, 3]])
+
+    # Dropped by another worker: this one stops serving its attached copy
+    SharedIndex(str(tmp_path)).drop("r1")
+    assert index.attach("r1") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_warm_publishes_only_ready_repos(tmp_path):
+    store = MemoryStore()
+    store.setup()
+    set_store(store)
+    repo_id = store.insert_repo("o", "r")
+    store.create_file_nodes(repo_id, ["a.py"])
+    store.insert_chunks(repo_id, [
+        {"id": f"c{i}", "file_path": "a.py", "chunk_index": i, "hash": f"h{i}", "content": "x", "embedding": [float(i), 1.0]}
+        for i in range(3)
+    ])
+    index = SharedIndex(str(tmp_path))
+    assert index.warm(repo_id) is None
+
+    store.promote_repo(repo_id)
+    ids, _, vectors = index.scan_vectors(repo_id)
+    assert sorted(ids) == ["c0", "c1", "c2"]
+    assert SharedIndex(str(tmp_path)).attach(repo_id).matrix.shape == (3, 2)
+    set_store(None)